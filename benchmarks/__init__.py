@@ -0,0 +1 @@
+# Offline benchmark and load-test harness; run it with `python -m benchmarks --help`.
@@ -0,0 +1,161 @@
+import time
+import random
+import asyncio
+import datetime
+import itertools
+
+import discord
+
+# Stand-ins for the parts of discord.py the command callbacks touch. Every
+# call that would go to Discord's API sleeps for a configurable round trip
+# instead, and each interaction records when it was first acknowledged (the
+# 3-second deadline) and whether the bot answered ephemerally.
+ACK_DEADLINE = 3.0
+
+_ids = itertools.count(1)
+
+def _snowflake():
+    # Real timestamps, so code that reads snowflake_time() sees sensible values.
+    return discord.utils.time_snowflake(datetime.datetime.now(datetime.timezone.utc)) + next(_ids) % 4096
+
+class FakeDiscord:
+    """Simulated Discord REST API: a round-trip delay and a call counter."""
+
+    def __init__(self, latency=0.05, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+
+    async def call(self):
+        self.calls += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class FakePermissions:
+    def __getattr__(self, name):
+        return True  # Benchmark users may do everything
+
+class FakeUser:
+    bot = False
+
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"bench-{user_id}"
+        self.mention = f"<@{user_id}>"
+        self.guild_permissions = FakePermissions()
+
+    def __str__(self):
+        return self.name
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+
+class FakeMessage:
+    def __init__(self, discord_api, interaction, content=None, **kwargs):
+        self._discord = discord_api
+        self.id = _snowflake()
+        self.guild = interaction.guild
+        self.channel = interaction.channel
+        self.content = content
+        self.view = kwargs.get("view")
+
+    async def edit(self, content=None, **kwargs):
+        await self._discord.call()
+        if content is not None:
+            self.content = content
+        if "view" in kwargs:
+            self.view = kwargs["view"]
+        return self
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def _respond(self, ephemeral=False):
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)
+        self._done = True
+        self._interaction.acknowledged(ephemeral)
+        await self._interaction.discord.call()
+
+    async def send_message(self, content=None, *, ephemeral=False, **kwargs):
+        await self._respond(ephemeral)
+        self._interaction.message = FakeMessage(self._interaction.discord, self._interaction, content, **kwargs)
+        self._interaction.sent.append(content)
+
+    async def defer(self, *, ephemeral=False, thinking=False):
+        await self._respond(ephemeral)
+        self._interaction.message = FakeMessage(self._interaction.discord, self._interaction)
+
+    async def edit_message(self, *, content=None, **kwargs):
+        await self._respond()
+        if self._interaction.message is not None:
+            self._interaction.message.content = content
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, *, ephemeral=False, **kwargs):
+        interaction = self._interaction
+        if not interaction.response.is_done():
+            raise discord.NotFound(_FakeHTTPResponse(404), "Unknown Webhook")
+        if ephemeral:
+            interaction.ephemeral = True
+        await interaction.discord.call()
+        interaction.sent.append(content)
+        return FakeMessage(interaction.discord, interaction, content, **kwargs)
+
+class _FakeHTTPResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = "Not Found"
+
+class FakeInteraction:
+    """Enough of discord.Interaction for the slash command and button callbacks in main.py."""
+
+    def __init__(self, discord_api, user_id, guild_id=None, channel_id=None, data=None):
+        self.discord = discord_api
+        self.id = _snowflake()
+        self.user = FakeUser(user_id)
+        self.guild_id = guild_id
+        self.guild = FakeGuild(guild_id) if guild_id is not None else None
+        self.channel_id = channel_id or _snowflake()
+        self.channel = FakeChannel(self.channel_id)
+        self.data = data or {}
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.message = None
+        self.sent = []  # Content of every message sent
+        self.ephemeral = False
+        self.created = time.perf_counter()
+        self.ack_latency = None
+
+    def acknowledged(self, ephemeral):
+        if self.ack_latency is None:
+            self.ack_latency = time.perf_counter() - self.created
+        if ephemeral:
+            self.ephemeral = True
+
+    async def original_response(self):
+        if self.message is None:
+            raise discord.NotFound(_FakeHTTPResponse(404), "Unknown Message")
+        await self.discord.call()
+        return self.message
+
+    async def edit_original_response(self, *, content=None, **kwargs):
+        message = await self.original_response()
+        message.content = content
+        if "view" in kwargs:
+            message.view = kwargs["view"]
+        return message
@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import tempfile
+import argparse
+import platform
+import traceback
+
+# Isolate the run before main.py (and the modules it imports) read their settings.
+_workdir = tempfile.mkdtemp(prefix="pybot-bench-")
+os.environ["PYBOT_DB_FILE"] = os.path.join(_workdir, "pybot.db")
+os.environ["PYBOT_CACHE_DIR"] = os.path.join(_workdir, "cache")
+os.environ.pop("CHAT_HISTORY_FILE", None)
+os.environ.pop("FACT_CORPUS_FILE", None)
+os.environ["METRICS_PORT"] = "0"
+os.environ.setdefault("WATCHDOG", "0")
+os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+
+import asyncio
+
+import discord
+
+import main
+import database
+import http_client
+import workers
+import search_service
+import crypto_utils
+from benchmarks.fakes import ACK_DEADLINE, FakeDiscord, FakeInteraction
+from benchmarks.stubs import HOSTS, StubServer, Upstream
+
+# Offline load test for the slash commands in main.py. The real callbacks run
+# against fake interactions (benchmarks/fakes.py) and local stub upstreams
+# (benchmarks/stubs.py); nothing talks to Discord or the internet.
+#
+#   python -m benchmarks --requests 500 --concurrency 50
+#   python -m benchmarks --scenarios chat,search --stub together:latency=0.8,error_rate=0.05
+#   python -m benchmarks --save results.json --baseline baseline.json
+#
+# Each scenario reports latency percentiles (whole callback and time to the
+# first response), throughput, errors and upstream calls. With --baseline,
+# results are compared to a saved run and the exit code is 1 if any scenario
+# regressed beyond --tolerance.
+PERCENTILES = (50, 95, 99)
+BASE_USER_ID = 100000000000000000
+BASE_GUILD_ID = 200000000000000000
+
+DICE = ("2d6+3", "4d6kh3", "1d20+5", "3d6!", "2d20kl1", "100d6", "100000d6")
+EXPRESSIONS = ("10*5+2", "r = 2; pi * r^2", "sqrt(2) + log(10)", "factorial(50)", "2^64 - 1", "{i} * 3 + 7")
+
+class Context:
+    """Shared by the scenarios: the fake Discord API, key spaces and ID layout."""
+
+    def __init__(self, fake_discord, upstreams, guilds, key_space):
+        self.discord = fake_discord
+        self.upstreams = upstreams
+        self.guilds = guilds
+        self.key_space = key_space
+
+    def key(self, i):
+        return i % self.key_space if self.key_space else i
+
+    def interaction(self, i, guild=True, user_id=None, data=None):
+        return FakeInteraction(
+            self.discord,
+            user_id or BASE_USER_ID + i,
+            guild_id=BASE_GUILD_ID + i % self.guilds if guild else None,
+            data=data
+        )
+
+def _callback(name):
+    return main.bot.tree.get_command(name).callback
+
+# --- Scenarios: run one request, return the interaction(s) to score ---
+
+async def scenario_tictactoe(ctx, i):
+    """One full game against the hard AI; the human always takes the first free cell."""
+    interaction = ctx.interaction(i)
+    await _callback("tictactoe")(interaction, difficulty=discord.app_commands.Choice(name="Hard", value="hard"))
+    view = interaction.message.view
+    while view is not None and not view.game.game_over:
+        cell = view.game.get_empty_cells(view.game.board)[0]
+        click = ctx.interaction(i, user_id=interaction.user.id, data={"custom_id": f"ttt:{view.session_id}:{cell}"})
+        click.message = interaction.message
+        await view.button_callback(click)
+    return interaction
+
+async def scenario_chat(ctx, i):
+    interaction = ctx.interaction(i)
+    await _callback("chat")(interaction, message=f"Benchmark question number {ctx.key(i)}?")
+    return interaction
+
+async def scenario_fact(ctx, i):
+    interaction = ctx.interaction(i)
+    await _callback("fact")(interaction)
+    return interaction
+
+async def scenario_dog(ctx, i):
+    interaction = ctx.interaction(i)
+    await _callback("dog")(interaction)
+    return interaction
+
+async def scenario_cat(ctx, i):
+    interaction = ctx.interaction(i)
+    await _callback("cat")(interaction)
+    return interaction
+
+async def scenario_search(ctx, i):
+    interaction = ctx.interaction(i)
+    await _callback("search")(interaction, query=f"pybot benchmark {ctx.key(i)}")
+    return interaction
+
+async def scenario_roll(ctx, i):
+    interaction = ctx.interaction(i)
+    await _callback("roll")(interaction, dice_string=DICE[i % len(DICE)])
+    return interaction
+
+async def scenario_calc(ctx, i):
+    interaction = ctx.interaction(i)
+    await _callback("calc")(interaction, expression=EXPRESSIONS[i % len(EXPRESSIONS)].format(i=ctx.key(i)))
+    return interaction
+
+async def scenario_setprefix(ctx, i):
+    interaction = ctx.interaction(i)
+    await _callback("setprefix")(interaction, new_prefix=f"!{i % 100}")
+    return interaction
+
+SCENARIOS = {
+    "tictactoe": scenario_tictactoe,
+    "chat": scenario_chat,
+    "fact": scenario_fact,
+    "dog": scenario_dog,
+    "cat": scenario_cat,
+    "search": scenario_search,
+    "roll": scenario_roll,
+    "calc": scenario_calc,
+    "setprefix": scenario_setprefix,
+}
+
+# --- Measurement ---
+
+def percentile(values, p):
+    """Linear-interpolated percentile of `values` (p in 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+async def run_scenario(ctx, name, requests, concurrency, first_index=0):
+    scenario = SCENARIOS[name]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    acks = []
+    errors = {}
+    ephemeral = 0
+    late_acks = 0
+
+    async def one(i):
+        nonlocal ephemeral, late_acks
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                interaction = await scenario(ctx, i)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                if errors[type(e).__name__] == 1:
+                    traceback.print_exc()  # First of its kind
+                return
+            latencies.append(time.perf_counter() - started)
+            if interaction.ack_latency is None:
+                errors["NoResponse"] = errors.get("NoResponse", 0) + 1
+                return
+            acks.append(interaction.ack_latency)
+            late_acks += interaction.ack_latency > ACK_DEADLINE
+            ephemeral += interaction.ephemeral
+
+    upstream_before = {n: (u.requests, u.errors) for n, u in ctx.upstreams.items()}
+    discord_before = ctx.discord.calls
+    started = time.perf_counter()
+    await asyncio.gather(*(one(first_index + i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "throughput": requests / elapsed if elapsed else None,
+        "errors": errors,
+        "ephemeral": ephemeral,
+        "late_acks": late_acks,
+        "discord_calls": ctx.discord.calls - discord_before,
+        "upstream_calls": {n: u.requests - upstream_before[n][0] for n, u in ctx.upstreams.items() if u.requests > upstream_before[n][0]},
+        "upstream_errors": {n: u.errors - upstream_before[n][1] for n, u in ctx.upstreams.items() if u.errors > upstream_before[n][1]},
+    }
+    for p in PERCENTILES:
+        result[f"p{p}"] = percentile(latencies, p)
+        result[f"ack_p{p}"] = percentile(acks, p)
+    result["mean"] = sum(latencies) / len(latencies) if latencies else None
+    return result
+
+async def run(args, upstreams):
+    ctx = Context(FakeDiscord(args.discord_latency, args.discord_jitter), upstreams, args.guilds, args.key_space)
+    stubs = StubServer(upstreams)
+    await stubs.start()
+    # The parts of Pybot.setup_hook the commands depend on
+    await http_client.start()
+    await database.init()
+    main.animal_images.start()
+    main.facts.start()
+
+    results = {}
+    try:
+        for name in args.scenarios:
+            if args.warmup:
+                await run_scenario(ctx, name, args.warmup, args.concurrency, first_index=args.requests)
+            results[name] = await run_scenario(ctx, name, args.requests, args.concurrency)
+            print(format_result(name, results[name]))
+    finally:
+        await main.animal_images.close()
+        await main.facts.close()
+        await http_client.close()
+        await stubs.close()
+        workers.shutdown()
+        search_service.shutdown()
+        crypto_utils.shutdown()
+        main.chat_cache.close()
+        await database.close()
+    return results
+
+# --- Reporting ---
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.1f}ms"
+
+def format_result(name, result):
+    errors = sum(result["errors"].values())
+    upstream = ", ".join(f"{n} {c}" for n, c in result["upstream_calls"].items()) or "none"
+    return (f"{name:<10} {result['throughput']:8.1f} req/s  "
+            + "  ".join(f"p{p} {_ms(result[f'p{p}'])}" for p in PERCENTILES)
+            + f"  (ack p99 {_ms(result['ack_p99'])})  errors {errors}, ephemeral {result['ephemeral']}, "
+            f"late acks {result['late_acks']}, upstream calls: {upstream}")
+
+def compare(results, baseline, tolerance):
+    """Prints the change against `baseline` and returns the names of regressed scenarios."""
+    regressed = []
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            print(f"{name:<10} not in baseline")
+            continue
+        changes = []
+        worse = False
+        for key in [f"p{p}" for p in PERCENTILES] + ["throughput"]:
+            if not old.get(key) or result.get(key) is None:
+                continue
+            change = (result[key] - old[key]) / old[key]
+            if key == "throughput":
+                change = -change  # Lower throughput is the regression
+            worse = worse or change > tolerance
+            changes.append(f"{key} {change * 100:+.1f}%")
+        if sum(result["errors"].values()) > sum(old.get("errors", {}).values()):
+            worse = True
+            changes.append(f"errors {sum(old.get('errors', {}).values())} -> {sum(result['errors'].values())}")
+        print(f"{name:<10} {'REGRESSED' if worse else 'ok':<9} " + ", ".join(changes))
+        if worse:
+            regressed.append(name)
+    return regressed
+
+def _parse_stub(text, upstreams):
+    """Applies a --stub NAME:key=value,... override."""
+    name, _, settings = text.partition(":")
+    if name not in upstreams:
+        raise argparse.ArgumentTypeError(f"unknown upstream {name!r} (choose from {', '.join(upstreams)})")
+    for setting in filter(None, settings.split(",")):
+        key, _, value = setting.partition("=")
+        if key not in ("latency", "jitter", "error_rate", "error_status", "tokens", "token_interval"):
+            raise argparse.ArgumentTypeError(f"unknown stub setting {key!r}")
+        setattr(upstreams[name], key, int(value) if key in ("error_status", "tokens") else float(value))
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Offline load test for Pybot's slash commands.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios (default: all).")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+    parser.add_argument("--concurrency", type=int, default=20, help="Requests in flight at once.")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per scenario before measuring.")
+    parser.add_argument("--guilds", type=int, default=1000, help="Distinct guilds the requests are spread over.")
+    parser.add_argument("--key-space", type=int, default=0, help="Distinct chat prompts, search queries and calc inputs (0: all unique).")
+    parser.add_argument("--latency", type=float, default=0.05, help="Upstream latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Extra random upstream latency, up to this many seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream requests that fail.")
+    parser.add_argument("--stub", action="append", default=[], metavar="NAME:KEY=VALUE,...",
+                        help=f"Per-upstream override, e.g. together:latency=0.8,error_rate=0.1 (upstreams: {', '.join(HOSTS.values())}).")
+    parser.add_argument("--discord-latency", type=float, default=0.05, help="Simulated Discord API round trip in seconds.")
+    parser.add_argument("--discord-jitter", type=float, default=0.02)
+    parser.add_argument("--save", metavar="PATH", help="Write the results as JSON.")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare against results saved with --save.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed slowdown before a scenario counts as regressed.")
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r} (choose from {', '.join(SCENARIOS)})")
+    return parser, args
+
+def main_cli(argv=None):
+    parser, args = parse_args(argv)
+    upstreams = {name: Upstream(args.latency, args.jitter, args.error_rate) for name in HOSTS.values()}
+    for text in args.stub:
+        try:
+            _parse_stub(text, upstreams)
+        except (argparse.ArgumentTypeError, ValueError) as e:
+            parser.error(f"--stub {text}: {e}")
+
+    results = asyncio.run(run(args, upstreams))
+    report = {
+        "created": time.time(),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("save", "baseline")},
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {args.save}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressed = compare(results, json.load(f), args.tolerance)
+        if regressed:
+            print(f"Regressed: {', '.join(regressed)}")
+            return 1
+    return 0
@@ -0,0 +1,176 @@
+import json
+import uuid
+import random
+import socket
+import asyncio
+import urllib.parse
+import urllib.request
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp import web
+
+import http_client
+import search_service
+
+# Local stand-ins for every upstream API the bot calls. One aiohttp server
+# serves them all under /<original host>/<original path>; http_client and the
+# DuckDuckGo search are redirected to it, so the real request, retry, pooling
+# and parsing code runs without any network access. Each upstream has its
+# own latency, jitter and error injection settings.
+
+class Upstream:
+    def __init__(self, latency=0.05, jitter=0.02, error_rate=0.0, error_status=500, tokens=40, token_interval=0.01):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.tokens = tokens                  # Together: words per completion
+        self.token_interval = token_interval  # Together: delay between streamed words
+        self.requests = 0
+        self.errors = 0
+
+    async def delay(self):
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def fail(self):
+        """Decides whether to inject an error into this request."""
+        self.requests += 1
+        if random.random() < self.error_rate:
+            self.errors += 1
+            return True
+        return False
+
+# Host of the real API -> upstream name used in settings and reports
+HOSTS = {
+    "api.together.xyz": "together",
+    "uselessfacts.jsph.pl": "facts",
+    "dog.ceo": "dog",
+    "api.thecatapi.com": "cat",
+    "duckduckgo.com": "ddg",
+}
+
+_WORDS = ("the", "bot", "answers", "quickly", "with", "a", "short", "and", "helpful", "reply")
+
+class StubServer:
+    def __init__(self, upstreams):
+        self.upstreams = upstreams  # name -> Upstream
+        self.base_url = None
+        self._runner = None
+        self._original_request = None
+        self._original_search = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/api.together.xyz/v1/chat/completions", self._together)
+        app.router.add_get("/uselessfacts.jsph.pl/random.json", self._fact)
+        app.router.add_get("/dog.ceo/api/breeds/image/random/{count}", self._dog)
+        app.router.add_get("/api.thecatapi.com/v1/images/search", self._cat)
+        app.router.add_get("/duckduckgo.com/search", self._ddg)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        await web.SockSite(self._runner, sock).start()
+        self.base_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        self._patch()
+
+    async def close(self):
+        self._unpatch()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def rewrite(self, url):
+        """Maps a real upstream URL onto the stub server."""
+        parts = urlsplit(str(url))
+        if parts.hostname not in HOSTS:
+            # Never let the benchmark reach the real network.
+            raise aiohttp.ClientConnectionError(f"No stub for {parts.hostname}")
+        return f"{self.base_url}/{parts.hostname}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+    def _patch(self):
+        # request() keeps the original URL, so metrics still label requests by the real host.
+        self._original_request = http_client._request_with_retries
+        original = self._original_request
+
+        async def request_with_retries(method, url, *args, **kwargs):
+            return await original(method, self.rewrite(url), *args, **kwargs)
+        http_client._request_with_retries = request_with_retries
+
+        self._original_search = search_service._search_blocking
+        search_service._search_blocking = self._search_blocking
+
+    def _unpatch(self):
+        if self._original_request is not None:
+            http_client._request_with_retries = self._original_request
+            search_service._search_blocking = self._original_search
+            self._original_request = self._original_search = None
+
+    def _search_blocking(self, query, max_results):
+        # Runs on the search thread pool like the real DDGS client.
+        url = f"{self.base_url}/duckduckgo.com/search?" + urllib.parse.urlencode({"q": query, "max_results": max_results})
+        with urllib.request.urlopen(url, timeout=search_service.TIMEOUT) as response:
+            return json.load(response)
+
+    async def _serve(self, name):
+        """Applies latency and error injection. Returns an error response or None."""
+        upstream = self.upstreams[name]
+        await upstream.delay()
+        if upstream.fail():
+            return web.json_response({"error": "injected failure"}, status=upstream.error_status)
+        return None
+
+    async def _together(self, request):
+        error = await self._serve("together")
+        if error is not None:
+            return error
+        upstream = self.upstreams["together"]
+        payload = await request.json()
+        words = [random.choice(_WORDS) for _ in range(upstream.tokens)]
+        if not payload.get("stream"):
+            await asyncio.sleep(upstream.token_interval * len(words))
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": " ".join(words)}}]})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for index, word in enumerate(words):
+            delta = word if index == 0 else " " + word
+            event = {"choices": [{"delta": {"content": delta}}]}
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+            await asyncio.sleep(upstream.token_interval)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def _fact(self, request):
+        error = await self._serve("facts")
+        if error is not None:
+            return error
+        fact_id = uuid.uuid4().hex
+        return web.json_response({"id": fact_id, "text": f"Benchmark fact {fact_id[:8]}."})
+
+    async def _dog(self, request):
+        error = await self._serve("dog")
+        if error is not None:
+            return error
+        count = int(request.match_info["count"])
+        return web.json_response({"message": [f"https://images.dog.ceo/breeds/bench/{uuid.uuid4().hex}.jpg" for _ in range(count)],
+                                  "status": "success"})
+
+    async def _cat(self, request):
+        error = await self._serve("cat")
+        if error is not None:
+            return error
+        count = int(request.query.get("limit", "1"))
+        return web.json_response([{"id": uuid.uuid4().hex[:8], "url": f"https://cdn2.thecatapi.com/images/{uuid.uuid4().hex}.jpg"}
+                                  for _ in range(count)])
+
+    async def _ddg(self, request):
+        error = await self._serve("ddg")
+        if error is not None:
+            return error
+        query = request.query.get("q", "")
+        count = int(request.query.get("max_results", "9"))
+        return web.json_response([{"title": f"{query} result {i + 1}", "href": f"https://example.com/{i + 1}",
+                                   "body": f"Benchmark result {i + 1} for {query}."} for i in range(count)])
@@ -0,0 +1,178 @@
+import time
+import random
+from functools import lru_cache
+
+# Generalized N×N, K-in-a-row engine. Boards are bitboards (bit i = cell i,
+# one integer per player). Moves are chosen by iterative-deepening negamax
+# with alpha-beta pruning, move ordering and a Zobrist-hashed transposition
+# table, under a wall-clock budget. search_best_move is a plain top-level
+# function so it can run in a worker process.
+
+WIN_SCORE = 1_000_000
+_EXACT, _LOWER, _UPPER = 0, 1, 2
+
+class BoardConfig:
+    def __init__(self, size, k):
+        if not 3 <= size <= 5:
+            raise ValueError("Board size must be between 3 and 5.")
+        if not 3 <= k <= size:
+            raise ValueError("Win length must be between 3 and the board size.")
+        self.size = size
+        self.k = k
+        self.cells = size * size
+        self.full = (1 << self.cells) - 1
+        self.line_masks = tuple(self._build_lines())
+        self.cell_lines = tuple(tuple(mask for mask in self.line_masks if mask >> cell & 1) for cell in range(self.cells))
+        # Search centre cells first; they take part in the most lines.
+        centre = (size - 1) / 2
+        self.move_order = tuple(sorted(range(self.cells), key=lambda i: (abs(i // size - centre) + abs(i % size - centre), i)))
+        rng = random.Random(size * 31 + k)
+        self.zobrist = tuple((rng.getrandbits(64), rng.getrandbits(64)) for _ in range(self.cells))
+        # Heuristic weight of an open line holding n stones of one player.
+        self.weights = tuple(0 if n == 0 else 10 ** (n - 1) for n in range(k + 1))
+
+    def _build_lines(self):
+        size, k = self.size, self.k
+        for row in range(size):
+            for col in range(size):
+                for d_row, d_col in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_row, end_col = row + d_row * (k - 1), col + d_col * (k - 1)
+                    if 0 <= end_row < size and 0 <= end_col < size:
+                        yield sum(1 << ((row + d_row * n) * size + col + d_col * n) for n in range(k))
+
+    def is_win(self, bits):
+        for mask in self.line_masks:
+            if bits & mask == mask:
+                return True
+        return False
+
+    def wins_with(self, bits, cell):
+        """True if placing a stone on `cell` completes a line for `bits`."""
+        bits |= 1 << cell
+        for mask in self.cell_lines[cell]:
+            if bits & mask == mask:
+                return True
+        return False
+
+    def evaluate(self, mover, opponent):
+        score = 0
+        weights = self.weights
+        for mask in self.line_masks:
+            mine = mover & mask
+            theirs = opponent & mask
+            if mine and not theirs:
+                score += weights[bin(mine).count("1")]
+            elif theirs and not mine:
+                score -= weights[bin(theirs).count("1")]
+        return score
+
+@lru_cache(maxsize=None)
+def get_config(size, k):
+    return BoardConfig(size, k)
+
+def to_bits(board, symbol):
+    bits = 0
+    for index, cell in enumerate(board):
+        if cell == symbol:
+            bits |= 1 << index
+    return bits
+
+class _Timeout(Exception):
+    pass
+
+class _Search:
+    def __init__(self, config, deadline):
+        self.config = config
+        self.deadline = deadline
+        self.table = {}
+        self.nodes = 0
+
+    def negamax(self, mover, opponent, side, key, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and time.monotonic() > self.deadline:
+            raise _Timeout()
+        config = self.config
+        occupied = mover | opponent
+        if occupied == config.full:
+            return 0
+        if depth == 0:
+            return config.evaluate(mover, opponent)
+
+        alpha_original = alpha
+        entry = self.table.get(key)
+        tt_move = None
+        if entry is not None:
+            entry_depth, flag, entry_score, tt_move = entry
+            if entry_depth >= depth:
+                if flag == _EXACT:
+                    return entry_score
+                if flag == _LOWER:
+                    alpha = max(alpha, entry_score)
+                elif flag == _UPPER:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+
+        moves = [cell for cell in config.move_order if not occupied >> cell & 1]
+        # An immediate win needs no further search.
+        for cell in moves:
+            if config.wins_with(mover, cell):
+                return WIN_SCORE - ply - 1
+        if tt_move is not None and tt_move in moves:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+
+        best_score, best_move = -WIN_SCORE * 2, moves[0]
+        zobrist = config.zobrist
+        for cell in moves:
+            score = -self.negamax(opponent, mover | 1 << cell, 1 - side, key ^ zobrist[cell][side], depth - 1, -beta, -alpha, ply + 1)
+            if score > best_score:
+                best_score, best_move = score, cell
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best_score <= alpha_original:
+            flag = _UPPER
+        elif best_score >= beta:
+            flag = _LOWER
+        else:
+            flag = _EXACT
+        self.table[key] = (depth, flag, best_score, best_move)
+        return best_score
+
+def search_best_move(board, size, k, symbol, time_budget):
+    """Returns the best cell for `symbol` ("X" or "O") on a list board, searching for at most `time_budget` seconds."""
+    config = get_config(size, k)
+    opponent_symbol = "O" if symbol == "X" else "X"
+    mover = to_bits(board, symbol)
+    opponent = to_bits(board, opponent_symbol)
+    occupied = mover | opponent
+    moves = [cell for cell in config.move_order if not occupied >> cell & 1]
+    if not moves:
+        return None
+    for cell in moves:
+        if config.wins_with(mover, cell):
+            return cell
+
+    side = 0 if symbol == "X" else 1
+    key = 0
+    for cell in range(config.cells):
+        if mover >> cell & 1:
+            key ^= config.zobrist[cell][side]
+        elif opponent >> cell & 1:
+            key ^= config.zobrist[cell][1 - side]
+
+    search = _Search(config, time.monotonic() + time_budget)
+    best_move = moves[0]
+    for depth in range(1, len(moves) + 1):
+        try:
+            score = search.negamax(mover, opponent, side, key, depth, -WIN_SCORE * 2, WIN_SCORE * 2, 0)
+        except _Timeout:
+            break
+        entry = search.table.get(key)
+        if entry is not None:
+            best_move = entry[3]
+        if abs(score) >= WIN_SCORE - config.cells:
+            break  # Forced result found; deeper search cannot change it.
+    return best_move
@@ -0,0 +1,87 @@
+import time
+import asyncio
+from collections import OrderedDict
+
+class TTLCache:
+    """A small LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._entries.clear()
+
+class InflightRequests:
+    """Coalesces concurrent calls for the same key into a single awaited call."""
+
+    def __init__(self):
+        self._futures = {}
+
+    def __len__(self):
+        return len(self._futures)
+
+    def get(self, key):
+        return self._futures.get(key)
+
+    async def run(self, key, fetch):
+        """Runs `fetch()` for `key`, or waits on the call already in flight.
+
+        Returns (result, coalesced) where coalesced is True if this caller
+        piggybacked on another caller's request.
+        """
+        future = self._futures.get(key)
+        while future is not None:
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # This caller was cancelled
+            # The leader was cancelled; the first follower to get here takes over.
+            future = self._futures.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._futures[key] = future
+        try:
+            result = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._futures.pop(key, None)
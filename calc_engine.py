@@ -0,0 +1,191 @@
+import os
+import ast
+import math
+import asyncio
+import operator
+from functools import lru_cache
+
+import workers
+from caching import TTLCache
+
+# Safe expression evaluator for /calc. Input is parsed with `ast` and only a
+# whitelist of nodes is accepted (numbers, arithmetic, math functions and
+# constants, and `name = value;` assignments). Evaluation counts steps and
+# checks operand sizes before every expensive operation, and runs in a worker
+# process with a wall-clock timeout as a last line of defence.
+MAX_LENGTH = 500
+MAX_STEPS = 10000
+MAX_INT_BITS = 4096
+MAX_FACTORIAL = 400
+TIMEOUT = float(os.getenv("CALC_TIMEOUT", "2"))
+
+class CalcError(ValueError):
+    pass
+
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+_UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+def _factorial(n):
+    if n != int(n) or not 0 <= n <= MAX_FACTORIAL:
+        raise CalcError(f"factorial() needs a whole number between 0 and {MAX_FACTORIAL}.")
+    return math.factorial(int(n))
+
+FUNCTIONS = {
+    "sqrt": math.sqrt, "cbrt": lambda x: math.copysign(abs(x) ** (1 / 3), x),
+    "sin": math.sin, "cos": math.cos, "tan": math.tan,
+    "asin": math.asin, "acos": math.acos, "atan": math.atan, "atan2": math.atan2,
+    "sinh": math.sinh, "cosh": math.cosh, "tanh": math.tanh,
+    "exp": math.exp, "log": math.log, "log10": math.log10, "log2": math.log2,
+    "abs": abs, "round": round, "floor": math.floor, "ceil": math.ceil,
+    "min": min, "max": max, "hypot": math.hypot,
+    "degrees": math.degrees, "radians": math.radians,
+    "factorial": _factorial, "gcd": math.gcd,
+}
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+def _check_size(value):
+    if isinstance(value, complex):
+        raise CalcError("Result is not a real number.")
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise CalcError("Result is too large.")
+    return value
+
+def _checked_binary(op, left, right):
+    # Estimate the size of expensive integer results before computing them.
+    if isinstance(left, int) and isinstance(right, int):
+        if op is operator.pow:
+            if right < 0:
+                left = float(left)
+            elif abs(left) > 1 and right * max(1, abs(left).bit_length() - 1) > MAX_INT_BITS:
+                raise CalcError("Result is too large.")
+        elif op is operator.mul and left.bit_length() + right.bit_length() > MAX_INT_BITS + 1:
+            raise CalcError("Result is too large.")
+    elif op is operator.pow and isinstance(right, (int, float)) and abs(right) > MAX_INT_BITS and abs(left) > 1:
+        raise CalcError("Result is too large.")
+    try:
+        return _check_size(op(left, right))
+    except ZeroDivisionError:
+        raise CalcError("Division by zero.")
+    except OverflowError:
+        raise CalcError("Result is too large.")
+
+def _validate(node, names):
+    """Checks `node` against the whitelist and returns it unchanged."""
+    if isinstance(node, ast.Constant):
+        if type(node.value) not in (int, float):
+            raise CalcError("Only numbers are allowed.")
+    elif isinstance(node, ast.BinOp):
+        if type(node.op) not in _BINARY_OPS:
+            raise CalcError("Unsupported operator.")
+        _validate(node.left, names)
+        _validate(node.right, names)
+    elif isinstance(node, ast.UnaryOp):
+        if type(node.op) not in _UNARY_OPS:
+            raise CalcError("Unsupported operator.")
+        _validate(node.operand, names)
+    elif isinstance(node, ast.Name):
+        if node.id not in CONSTANTS and node.id not in names:
+            raise CalcError(f"Unknown name '{node.id}'.")
+    elif isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+            raise CalcError("Unknown function.")
+        for arg in node.args:
+            _validate(arg, names)
+    else:
+        raise CalcError("Unsupported syntax.")
+    return node
+
+@lru_cache(maxsize=1024)
+def compile_expression(text):
+    """Parses and validates `text`, returning ((name, node) assignments, final node)."""
+    if len(text) > MAX_LENGTH:
+        raise CalcError(f"Expression is longer than {MAX_LENGTH} characters.")
+    try:
+        tree = ast.parse(text.replace("^", "**"), mode="exec")
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        raise CalcError("Invalid mathematical expression.")
+    if not tree.body or not isinstance(tree.body[-1], ast.Expr):
+        raise CalcError("The expression must end with a value to calculate.")
+
+    names = set()
+    assignments = []
+    for statement in tree.body[:-1]:
+        if not (isinstance(statement, ast.Assign) and len(statement.targets) == 1 and isinstance(statement.targets[0], ast.Name)):
+            raise CalcError("Only `name = value` assignments are allowed before the expression.")
+        name = statement.targets[0].id
+        if name in CONSTANTS or name in FUNCTIONS:
+            raise CalcError(f"'{name}' is a reserved name.")
+        assignments.append((name, _validate(statement.value, names)))
+        names.add(name)
+    return tuple(assignments), _validate(tree.body[-1].value, names)
+
+class _Evaluator:
+    def __init__(self):
+        self.steps = 0
+        self.variables = {}
+
+    def eval(self, node):
+        self.steps += 1
+        if self.steps > MAX_STEPS:
+            raise CalcError("Expression is too complex.")
+        if isinstance(node, ast.Constant):
+            return _check_size(node.value)
+        if isinstance(node, ast.BinOp):
+            return _checked_binary(_BINARY_OPS[type(node.op)], self.eval(node.left), self.eval(node.right))
+        if isinstance(node, ast.UnaryOp):
+            return _UNARY_OPS[type(node.op)](self.eval(node.operand))
+        if isinstance(node, ast.Name):
+            return self.variables[node.id] if node.id in self.variables else CONSTANTS[node.id]
+        # ast.Call
+        args = [self.eval(arg) for arg in node.args]
+        try:
+            return _check_size(FUNCTIONS[node.func.id](*args))
+        except CalcError:
+            raise
+        except ZeroDivisionError:
+            raise CalcError("Division by zero.")  # e.g. log(2, 1)
+        except (TypeError, ValueError, OverflowError) as e:
+            raise CalcError(f"{node.func.id}(): {e}")
+
+def evaluate(text):
+    """Evaluates `text` synchronously. Raises CalcError for invalid or too expensive input."""
+    assignments, expression = compile_expression(text.strip())
+    evaluator = _Evaluator()
+    for name, node in assignments:
+        evaluator.variables[name] = evaluator.eval(node)
+    return evaluator.eval(expression)
+
+# Results are deterministic, so evaluated expressions are cached in the bot process.
+_results = TTLCache(1024, 3600)
+
+async def evaluate_async(text):
+    """Evaluates `text` in the calc worker process, with caching and a wall-clock limit."""
+    key = text.strip()
+    cached = _results.get(key)
+    if cached is not None:
+        return cached
+    try:
+        result = await workers.run("calc", evaluate, key, timeout=TIMEOUT)
+    except CalcError:
+        raise
+    except asyncio.TimeoutError:
+        raise CalcError("Calculation took too long.")
+    except Exception as e:
+        # Crashed or restarted worker pool (e.g. another calculation timed out)
+        print(f"Calc worker failed: {e!r}")
+        raise CalcError("The calculator is unavailable right now. Please try again.")
+    _results.set(key, result)
+    return result
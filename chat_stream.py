@@ -0,0 +1,115 @@
+import os
+import json
+import time
+
+# Discord rejects messages over 2000 characters.
+MESSAGE_LIMIT = 2000
+# Edits to the same message are coalesced so we stay well inside Discord's
+# edit rate limit (roughly 5 edits per 5 seconds per channel).
+EDIT_INTERVAL = float(os.getenv("CHAT_STREAM_EDIT_INTERVAL", "1.0"))
+# Flush early once this many new characters are pending, but never faster
+# than EDIT_MIN_INTERVAL.
+EDIT_CHUNK_CHARS = int(os.getenv("CHAT_STREAM_EDIT_CHARS", "400"))
+EDIT_MIN_INTERVAL = float(os.getenv("CHAT_STREAM_EDIT_MIN_INTERVAL", "0.5"))
+
+def split_message(text, limit=MESSAGE_LIMIT):
+    """Splits text into chunks that fit in a Discord message, preferring line or word breaks."""
+    chunks = []
+    while len(text) > limit:
+        cut = _find_cut(text, limit)
+        chunks.append(text[:cut])
+        text = text[cut:]
+    if text or not chunks:
+        chunks.append(text)
+    return chunks
+
+def _find_cut(text, limit):
+    for separator in ("\n", " "):
+        cut = text.rfind(separator, limit // 2, limit)
+        if cut != -1:
+            return cut + 1
+    return limit
+
+async def iter_sse_deltas(response):
+    """Yields content deltas from an OpenAI-style server-sent event stream."""
+    async for raw_line in response.content:
+        line = raw_line.decode("utf-8").strip()
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError:
+            continue
+        choices = event.get("choices") or [{}]
+        delta = choices[0].get("delta", {}).get("content")
+        if delta:
+            yield delta
+
+async def send_chunks(interaction, text, edit_original=False):
+    """Sends text as one or more follow-up messages, optionally replacing the original response first."""
+    for index, chunk in enumerate(split_message(text)):
+        if index == 0 and edit_original:
+            await interaction.edit_original_response(content=chunk)
+        else:
+            await interaction.followup.send(chunk)
+
+class MessageStreamer:
+    """Progressively writes streamed text into follow-up messages of a deferred interaction.
+
+    Text is buffered and flushed as message edits at most every EDIT_INTERVAL
+    seconds (or sooner once EDIT_CHUNK_CHARS are pending). Output that grows
+    past the message limit rolls over into additional follow-up messages.
+    With edit_original=True the first chunk replaces the original response
+    (e.g. a queue-position notice) instead of sending a new follow-up.
+    """
+
+    def __init__(self, interaction, edit_original=False):
+        self.interaction = interaction
+        self.edit_original = edit_original
+        self.message = None
+        self.text = ""        # Content that belongs to the current message
+        self.shown = ""       # Content Discord currently shows for it
+        self.messages_sent = 0
+        self.last_edit = 0.0
+
+    async def feed(self, delta):
+        self.text += delta
+        while len(self.text) > MESSAGE_LIMIT:
+            cut = _find_cut(self.text, MESSAGE_LIMIT)
+            head, self.text = self.text[:cut], self.text[cut:]
+            await self._write(head)
+            # The next flush starts a fresh follow-up message.
+            self.message = None
+            self.shown = ""
+
+        pending = len(self.text) - len(self.shown)
+        elapsed = time.monotonic() - self.last_edit
+        if self.message is None or elapsed >= EDIT_INTERVAL or (pending >= EDIT_CHUNK_CHARS and elapsed >= EDIT_MIN_INTERVAL):
+            await self._write(self.text)
+
+    async def finish(self, fallback="An error occurred in AI response!"):
+        if self.messages_sent == 0 and not self.text.strip():
+            self.text = fallback
+        if self.text != self.shown or self.message is None:
+            await self._write(self.text)
+
+    @property
+    def has_output(self):
+        return self.messages_sent > 0
+
+    async def _write(self, content):
+        if not content.strip():
+            return
+        if self.message is None:
+            if self.edit_original and self.messages_sent == 0:
+                self.message = await self.interaction.edit_original_response(content=content)
+            else:
+                self.message = await self.interaction.followup.send(content)
+            self.messages_sent += 1
+        elif content != self.shown:
+            await self.message.edit(content=content)
+        self.shown = content
+        self.last_edit = time.monotonic()
@@ -0,0 +1,227 @@
+import os
+import sys
+import time
+import queue
+import asyncio
+import signal
+import threading
+import multiprocessing
+
+import aiohttp
+from dotenv import load_dotenv
+
+import database
+
+# Cluster mode: `python cluster.py` starts a supervisor that splits the
+# shards into contiguous ranges and runs each range as its own bot process
+# (an AutoShardedBot with explicit shard_ids). Crashed clusters are restarted
+# with backoff. Processes talk over multiprocessing queues through the
+# supervisor: settings-cache invalidations are relayed to every other
+# cluster, and each cluster's stats are merged and broadcast back.
+#
+# `python main.py` still runs a single process with automatic sharding; in
+# that case nothing in this module is active.
+STATS_INTERVAL = float(os.getenv("CLUSTER_STATS_INTERVAL", "15"))
+RESTART_BACKOFF_MAX = 60
+HEALTHY_UPTIME = 60  # A cluster that ran this long gets its restart backoff reset
+# Files that each cluster must keep separately
+PER_CLUSTER_FILES = ("CHAT_HISTORY_FILE", "FACT_CORPUS_FILE")
+
+# Set in cluster worker processes by attach()
+CLUSTER_ID = None
+SHARD_IDS = None
+SHARD_COUNT = None
+cluster_stats = {}  # cluster id -> latest stats from every cluster
+_inbox = None   # supervisor -> this cluster
+_outbox = None  # this cluster -> supervisor
+_listener = None
+_stats_task = None
+
+def shard_ranges(shard_count, cluster_count):
+    """Splits shard IDs 0..shard_count-1 into `cluster_count` contiguous, non-empty ranges."""
+    cluster_count = max(1, min(cluster_count, shard_count))
+    return [list(range(i * shard_count // cluster_count, (i + 1) * shard_count // cluster_count))
+            for i in range(cluster_count)]
+
+def shard_for_guild(guild_id, shard_count):
+    return (guild_id >> 22) % shard_count
+
+def owns_guild(guild_id):
+    """Whether this process handles `guild_id` (DMs belong to the cluster with shard 0)."""
+    if SHARD_IDS is None:
+        return True
+    return shard_for_guild(guild_id or 0, SHARD_COUNT) in SHARD_IDS
+
+# --- Worker side ---
+
+def attach(cluster_id, shard_ids, shard_count, inbox, outbox):
+    global CLUSTER_ID, SHARD_IDS, SHARD_COUNT, _inbox, _outbox
+    CLUSTER_ID, SHARD_IDS, SHARD_COUNT = cluster_id, shard_ids, shard_count
+    _inbox, _outbox = inbox, outbox
+
+def _send(message):
+    if _outbox is not None:
+        _outbox.put(message)
+
+def publish_invalidate(guild_id):
+    """Tells the other clusters to drop their cached settings for `guild_id`."""
+    _send({"type": "invalidate", "guild_id": guild_id, "from": CLUSTER_ID})
+
+def _handle(message):
+    if message["type"] == "invalidate":
+        database.invalidate(message["guild_id"])
+    elif message["type"] == "cluster_stats":
+        cluster_stats.clear()
+        cluster_stats.update(message["clusters"])
+
+def _listen(loop, stop):
+    # Runs on its own thread; multiprocessing queues have no asyncio API.
+    while not stop.is_set():
+        try:
+            message = _inbox.get(timeout=1)
+        except queue.Empty:
+            continue
+        except (EOFError, OSError):
+            return
+        loop.call_soon_threadsafe(_handle, message)
+
+async def _report_stats(get_stats):
+    while True:
+        _send({"type": "stats", "cluster": CLUSTER_ID, "stats": dict(get_stats(), time=time.time())})
+        await asyncio.sleep(STATS_INTERVAL)
+
+async def start(get_stats):
+    """Starts the IPC listener and stats reporting. Does nothing outside cluster mode."""
+    global _listener, _stats_task
+    if _inbox is None:
+        return
+    stop = threading.Event()
+    loop = asyncio.get_running_loop()
+    _listener = (stop, loop.run_in_executor(None, _listen, loop, stop))
+    _stats_task = asyncio.create_task(_report_stats(get_stats))
+
+async def stop():
+    global _listener, _stats_task
+    if _stats_task is not None:
+        _stats_task.cancel()
+        _stats_task = None
+    if _listener is not None:
+        flag, future = _listener
+        flag.set()
+        await future
+        _listener = None
+
+def _worker_main(cluster_id, shard_ids, shard_count, inbox, outbox):
+    load_dotenv()
+    for name in PER_CLUSTER_FILES:
+        if os.getenv(name):
+            os.environ[name] = f"{os.environ[name]}.{cluster_id}"
+    # With `python cluster.py` this function runs in __mp_main__, not in the `cluster`
+    # module that main.py imports; attach to the latter so the bot sees its shards.
+    import cluster
+    cluster.attach(cluster_id, shard_ids, shard_count, inbox, outbox)
+    import main  # Builds the bot with this cluster's shards
+    main.bot.run(main.DISCORD_TOKEN)
+
+# --- Supervisor side ---
+
+async def _fetch_recommended_shards(token):
+    async with aiohttp.ClientSession() as session:
+        async with session.get("https://discord.com/api/v10/gateway/bot", headers={"Authorization": f"Bot {token}"}) as response:
+            response.raise_for_status()
+            return (await response.json())["shards"]
+
+class Supervisor:
+    def __init__(self, shard_count, cluster_count):
+        self.context = multiprocessing.get_context("spawn")
+        self.ranges = shard_ranges(shard_count, cluster_count)
+        self.shard_count = shard_count
+        self.inbox = self.context.Queue()  # Shared by all clusters
+        self.outboxes = [self.context.Queue() for _ in self.ranges]
+        self.processes = [None] * len(self.ranges)
+        self.started_at = [0.0] * len(self.ranges)
+        self.backoff = [1.0] * len(self.ranges)
+        self.restart_at = [0.0] * len(self.ranges)
+        self.stats = {}
+        self.stopping = False
+
+    def _spawn(self, cluster_id):
+        process = self.context.Process(
+            target=_worker_main, name=f"pybot-cluster-{cluster_id}",
+            args=(cluster_id, self.ranges[cluster_id], self.shard_count, self.outboxes[cluster_id], self.inbox)
+        )
+        process.start()
+        self.processes[cluster_id] = process
+        self.started_at[cluster_id] = time.monotonic()
+        print(f"Cluster {cluster_id} started (pid {process.pid}, shards {self.ranges[cluster_id][0]}-{self.ranges[cluster_id][-1]})")
+
+    def _check_processes(self):
+        now = time.monotonic()
+        for cluster_id, process in enumerate(self.processes):
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                # It just died: schedule a restart.
+                if now - self.started_at[cluster_id] >= HEALTHY_UPTIME:
+                    self.backoff[cluster_id] = 1.0
+                print(f"Cluster {cluster_id} exited with code {process.exitcode}; restarting in {self.backoff[cluster_id]:.0f}s")
+                self.restart_at[cluster_id] = now + self.backoff[cluster_id]
+                self.backoff[cluster_id] = min(self.backoff[cluster_id] * 2, RESTART_BACKOFF_MAX)
+                self.processes[cluster_id] = None
+                self.stats.pop(cluster_id, None)
+            elif now >= self.restart_at[cluster_id]:
+                self._spawn(cluster_id)
+
+    def _relay(self, message):
+        if message["type"] == "invalidate":
+            for cluster_id, outbox in enumerate(self.outboxes):
+                if cluster_id != message.get("from"):
+                    outbox.put(message)
+        elif message["type"] == "stats":
+            self.stats[message["cluster"]] = message["stats"]
+            for outbox in self.outboxes:
+                outbox.put({"type": "cluster_stats", "clusters": dict(self.stats)})
+
+    def run(self):
+        for cluster_id in range(len(self.ranges)):
+            self._spawn(cluster_id)
+        while not self.stopping:
+            try:
+                self._relay(self.inbox.get(timeout=1))
+            except queue.Empty:
+                pass
+            self._check_processes()
+
+    def shutdown(self):
+        self.stopping = True
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                os.kill(process.pid, signal.SIGINT)  # bot.run() closes the bot cleanly on Ctrl-C
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout=30)
+                if process.is_alive():
+                    process.kill()
+
+def run_cluster():
+    load_dotenv()
+    token = os.getenv("DISCORD_TOKEN")
+    if not token:
+        print("DISCORD_TOKEN not found in .env file. Please set it.")
+        return
+    # SHARD_COUNT defaults to Discord's recommendation, CLUSTER_COUNT to one cluster per CPU.
+    shard_count = int(os.getenv("SHARD_COUNT") or asyncio.run(_fetch_recommended_shards(token)))
+    supervisor = Supervisor(shard_count, int(os.getenv("CLUSTER_COUNT", str(os.cpu_count() or 1))))
+    print(f"Starting {len(supervisor.ranges)} cluster(s) for {shard_count} shard(s)")
+
+    def handle_signal(signum, frame):
+        supervisor.stopping = True
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    try:
+        supervisor.run()
+    finally:
+        supervisor.shutdown()
+
+if __name__ == "__main__":
+    sys.exit(run_cluster())
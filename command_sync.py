@@ -0,0 +1,24 @@
+import json
+import hashlib
+
+import database
+
+# Global command sync is slow and heavily rate-limited, so it only happens
+# when the command tree actually changed. The tree is serialized the same way
+# it is sent to Discord and hashed; the hash of the last successful sync is
+# kept in the database.
+STATE_KEY = "command_tree_hash"
+
+def tree_hash(tree, application_id):
+    commands = sorted((command.to_dict(tree) for command in tree.get_commands()), key=lambda c: (c.get("type", 1), c["name"]))
+    payload = json.dumps({"application_id": application_id, "commands": commands}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+async def sync_if_changed(tree, application_id, force=False):
+    """Syncs the global command tree unless it matches the last sync. Returns the number synced, or None if skipped."""
+    digest = tree_hash(tree, application_id)
+    if not force and await database.get_state(STATE_KEY) == digest:
+        return None
+    synced = await tree.sync()
+    await database.set_state(STATE_KEY, digest)
+    return len(synced)
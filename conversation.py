@@ -0,0 +1,200 @@
+import os
+import json
+import time
+from collections import OrderedDict, deque
+
+# Bounded per-(user, channel) chat history for /chat. The store as a whole is
+# capped by conversation count, total tokens and total characters, so memory
+# stays flat no matter how many channels are active.
+MAX_CONVERSATIONS = int(os.getenv("CHAT_HISTORY_MAX_CONVERSATIONS", "1000"))
+MAX_TOTAL_TOKENS = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "500000"))
+MAX_TOTAL_CHARS = int(os.getenv("CHAT_HISTORY_MAX_CHARS", "2000000"))
+HISTORY_TTL = float(os.getenv("CHAT_HISTORY_TTL", "1800"))
+# Token budget for history (summary + turns) in each prompt.
+PROMPT_BUDGET = int(os.getenv("CHAT_PROMPT_BUDGET", "2000"))
+# Older turns are folded into a short summary capped at this many characters.
+SUMMARY_CHARS = int(os.getenv("CHAT_SUMMARY_CHARS", "600"))
+HISTORY_FILE = os.getenv("CHAT_HISTORY_FILE")
+
+def estimate_tokens(text):
+    # Rough estimate (~4 characters per token) that is good enough for budgeting.
+    return len(text) // 4 + 1
+
+def _excerpt(text, limit=80):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+class Conversation:
+    def __init__(self):
+        self.turns = deque()  # (role, content, tokens)
+        self.summary = ""
+        self.tokens = 0
+        self.chars = 0
+        self.updated_at = time.time()
+
+    def add(self, role, content):
+        tokens = estimate_tokens(content)
+        self.turns.append((role, content, tokens))
+        self.tokens += tokens
+        self.chars += len(content)
+        self.updated_at = time.time()
+
+    def fold_oldest(self):
+        """Moves the oldest turn into the summary and returns the tokens/chars freed."""
+        role, content, tokens = self.turns.popleft()
+        old_summary_tokens = estimate_tokens(self.summary) if self.summary else 0
+        old_summary_chars = len(self.summary)
+        note = f"{role}: {_excerpt(content)}"
+        summary = f"{self.summary}; {note}" if self.summary else note
+        if len(summary) > SUMMARY_CHARS:
+            summary = "…" + summary[-(SUMMARY_CHARS - 1):]
+        self.summary = summary
+        freed_tokens = tokens + old_summary_tokens - estimate_tokens(summary)
+        freed_chars = len(content) + old_summary_chars - len(summary)
+        self.tokens -= freed_tokens
+        self.chars -= freed_chars
+        return freed_tokens, freed_chars
+
+    def to_dict(self):
+        return {
+            "turns": [[role, content] for role, content, _ in self.turns],
+            "summary": self.summary,
+            "updated_at": self.updated_at
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        conversation = cls()
+        for role, content in data.get("turns", []):
+            conversation.add(role, content)
+        conversation.summary = data.get("summary", "")
+        if conversation.summary:
+            conversation.tokens += estimate_tokens(conversation.summary)
+            conversation.chars += len(conversation.summary)
+        conversation.updated_at = data.get("updated_at", time.time())
+        return conversation
+
+class ConversationStore:
+    """LRU of conversations keyed by (user_id, channel_id) with TTL expiry and global size caps."""
+
+    def __init__(self, max_conversations=MAX_CONVERSATIONS, max_tokens=MAX_TOTAL_TOKENS,
+                 max_chars=MAX_TOTAL_CHARS, ttl=HISTORY_TTL, prompt_budget=PROMPT_BUDGET, path=HISTORY_FILE):
+        self.max_conversations = max_conversations
+        self.max_tokens = max_tokens
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self.prompt_budget = prompt_budget
+        self.path = path
+        self._conversations = OrderedDict()
+        self.total_tokens = 0
+        self.total_chars = 0
+
+    def __len__(self):
+        return len(self._conversations)
+
+    def _get(self, key):
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            return None
+        if time.time() - conversation.updated_at > self.ttl:
+            self._remove(key)
+            return None
+        self._conversations.move_to_end(key)
+        return conversation
+
+    def _remove(self, key):
+        conversation = self._conversations.pop(key, None)
+        if conversation is not None:
+            self.total_tokens -= conversation.tokens
+            self.total_chars -= conversation.chars
+
+    def clear(self, key):
+        self._remove(key)
+
+    def has_history(self, key):
+        return self._get(key) is not None
+
+    def build_messages(self, key, system_messages, user_input):
+        """Returns the prompt: system messages, a summary of older turns, recent turns and the new input.
+
+        Recent turns are kept newest-first until PROMPT_BUDGET tokens are used;
+        anything older is represented only by the running summary.
+        """
+        conversation = self._get(key)
+        history = []
+        if conversation is not None:
+            budget = self.prompt_budget
+            summary = conversation.summary
+            kept = []
+            for index in range(len(conversation.turns) - 1, -1, -1):
+                role, content, tokens = conversation.turns[index]
+                if tokens > budget:
+                    # Everything older than this turn only survives as a summary excerpt.
+                    dropped = [f"{r}: {_excerpt(c)}" for r, c, _ in list(conversation.turns)[:index + 1]]
+                    summary = "; ".join(filter(None, [summary] + dropped))[-SUMMARY_CHARS:]
+                    break
+                kept.append({"role": role, "content": content})
+                budget -= tokens
+            if summary:
+                history.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+            history.extend(reversed(kept))
+        return list(system_messages) + history + [{"role": "user", "content": user_input}]
+
+    def record(self, key, user_input, reply):
+        conversation = self._get(key)
+        if conversation is None:
+            conversation = Conversation()
+            self._conversations[key] = conversation
+        before_tokens, before_chars = conversation.tokens, conversation.chars
+        conversation.add("user", user_input)
+        conversation.add("assistant", reply)
+        # Keep each conversation within twice the prompt budget; older turns become summary.
+        while conversation.turns and conversation.tokens > self.prompt_budget * 2:
+            conversation.fold_oldest()
+        self.total_tokens += conversation.tokens - before_tokens
+        self.total_chars += conversation.chars - before_chars
+        self._evict()
+
+    def _evict(self):
+        while self._conversations and (
+            len(self._conversations) > self.max_conversations
+            or self.total_tokens > self.max_tokens
+            or self.total_chars > self.max_chars
+        ):
+            key = next(iter(self._conversations))
+            self._remove(key)
+
+    def purge_expired(self):
+        now = time.time()
+        for key in [k for k, c in self._conversations.items() if now - c.updated_at > self.ttl]:
+            self._remove(key)
+
+    def load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Failed to load chat history: {e}")
+            return
+        for entry in data:
+            key = tuple(entry["key"])
+            conversation = Conversation.from_dict(entry)
+            self._conversations[key] = conversation
+            self.total_tokens += conversation.tokens
+            self.total_chars += conversation.chars
+        self.purge_expired()
+        self._evict()
+
+    def save(self):
+        if not self.path:
+            return
+        self.purge_expired()
+        data = [dict(conversation.to_dict(), key=list(key)) for key, conversation in self._conversations.items()]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,93 @@
+import os
+import hmac
+import base64
+import asyncio
+import hashlib
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+from caching import TTLCache
+
+# Passphrase encryption for /encrypt and /decrypt.
+#
+# Tokens are "pb2$<salt>$<fernet token>" with the Fernet key derived by scrypt
+# from the passphrase and a random salt. Tokens without the prefix are the
+# original format (key = SHA-256 of the passphrase) and can still be
+# decrypted. scrypt is deliberately slow, so derivation runs on a small
+# thread pool and derived keys are cached per user for a short time.
+# `cryptography` is imported on first use to keep startup fast.
+TOKEN_PREFIX = "pb2$"
+SALT_BYTES = 16
+SCRYPT_N = int(os.getenv("CRYPTO_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = 8
+SCRYPT_P = 1
+KEY_CACHE_ENTRIES = int(os.getenv("CRYPTO_KEY_CACHE_ENTRIES", "256"))
+KEY_CACHE_TTL = float(os.getenv("CRYPTO_KEY_CACHE_TTL", "600"))
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("CRYPTO_WORKERS", "2")), thread_name_prefix="pybot-kdf")
+# Cache keys never hold the passphrase itself, only an HMAC under a per-process secret.
+_process_secret = secrets.token_bytes(32)
+_keys = TTLCache(KEY_CACHE_ENTRIES, KEY_CACHE_TTL)   # (user_id, passphrase id, salt) -> Fernet
+_salts = TTLCache(KEY_CACHE_ENTRIES, KEY_CACHE_TTL)  # (user_id, passphrase id) -> salt used for encryption
+
+class DecryptionError(Exception):
+    """Wrong passphrase or malformed token."""
+
+def _fernet(key):
+    from cryptography.fernet import Fernet
+    return Fernet(key)
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _passphrase_id(passphrase):
+    return hmac.new(_process_secret, passphrase.encode(), hashlib.sha256).digest()
+
+def _derive_key(passphrase, salt):
+    key = hashlib.scrypt(passphrase.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=32)
+    return _fernet(base64.urlsafe_b64encode(key))
+
+def _legacy_fernet(passphrase):
+    return _fernet(base64.urlsafe_b64encode(hashlib.sha256(passphrase.encode()).digest()))
+
+async def _get_fernet(user_id, passphrase, salt):
+    cache_key = (user_id, _passphrase_id(passphrase), salt)
+    fernet = _keys.get(cache_key)
+    if fernet is None:
+        loop = asyncio.get_running_loop()
+        fernet = await loop.run_in_executor(_executor, _derive_key, passphrase, salt)
+        _keys.set(cache_key, fernet)
+    return fernet
+
+async def encrypt(user_id, passphrase, text):
+    # Reusing the salt for a while lets repeated use skip the KDF; Fernet adds its own random IV.
+    salt_key = (user_id, _passphrase_id(passphrase))
+    salt = _salts.get(salt_key)
+    if salt is None:
+        salt = secrets.token_bytes(SALT_BYTES)
+        _salts.set(salt_key, salt)
+    fernet = await _get_fernet(user_id, passphrase, salt)
+    return f"{TOKEN_PREFIX}{_b64encode(salt)}${fernet.encrypt(text.encode()).decode()}"
+
+async def decrypt(user_id, passphrase, token):
+    """Decrypts a current or legacy token. Raises DecryptionError on a wrong passphrase or bad token."""
+    from cryptography.fernet import InvalidToken
+    token = token.strip()
+    try:
+        if not token.startswith(TOKEN_PREFIX):
+            return _legacy_fernet(passphrase).decrypt(token.encode()).decode()
+        try:
+            encoded_salt, fernet_token = token[len(TOKEN_PREFIX):].split("$", 1)
+            salt = _b64decode(encoded_salt)
+        except ValueError:
+            raise DecryptionError()
+        fernet = await _get_fernet(user_id, passphrase, salt)
+        return fernet.decrypt(fernet_token.encode()).decode()
+    except InvalidToken:
+        raise DecryptionError()
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -1,26 +1,260 @@
+import os
 import json
+import sqlite3
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 
-DB_FILE = 'prefixes.json'
+# Per-guild settings live in SQLite (WAL mode). All database work runs on a
+# single dedicated thread that owns the connection, so the event loop never
+# blocks on disk I/O. Reads go through an in-memory cache; writes update the
+# cache immediately and are flushed to disk in batches (write-behind).
+DB_FILE = os.getenv("PYBOT_DB_FILE", 'pybot.db')
+LEGACY_PREFIX_FILE = 'prefixes.json'
+DEFAULT_PREFIX = 'py '
+FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "5"))
+FLUSH_THRESHOLD = int(os.getenv("DB_FLUSH_THRESHOLD", "100"))
 
-def _load_prefixes():
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pybot-db")
+_conn = None
+_cache = {}  # (guild_id, key) -> value, or None if known to be unset
+_dirty = {}  # (guild_id, key) -> value waiting to be written
+_dirty_games = {}  # session_id -> serialized game state, or None to delete
+_versions = {}  # settings key or session_id -> number of its latest unflushed write
+_write_counter = itertools.count(1)
+_flush_wakeup = None
+_flush_task = None
+
+def _connect():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DB_FILE)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS guild_settings ("
+            "guild_id INTEGER NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (guild_id, key))"
+        )
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS game_sessions ("
+            "session_id TEXT PRIMARY KEY, state TEXT NOT NULL)"
+        )
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS bot_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS moderation_log ("
+            "id INTEGER PRIMARY KEY, created_at REAL NOT NULL, guild_id INTEGER NOT NULL, "
+            "moderator_id INTEGER NOT NULL, target_id INTEGER NOT NULL, action TEXT NOT NULL, "
+            "outcome TEXT NOT NULL, reason TEXT)"
+        )
+        _conn.commit()
+        _migrate_legacy_prefixes(_conn)
+    return _conn
+
+def _migrate_legacy_prefixes(conn):
+    # One-shot import of the old prefixes.json; the file is renamed afterwards.
     try:
-        with open(DB_FILE, 'r') as f:
-            return json.load(f)
+        with open(LEGACY_PREFIX_FILE, 'r') as f:
+            prefixes = json.load(f)
     except FileNotFoundError:
-        return {}
+        return
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Failed to migrate {LEGACY_PREFIX_FILE}: {e}")
+        return
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO guild_settings (guild_id, key, value) VALUES (?, 'prefix', ?)",
+            [(int(guild_id), prefix) for guild_id, prefix in prefixes.items()]
+        )
+    os.replace(LEGACY_PREFIX_FILE, f"{LEGACY_PREFIX_FILE}.migrated")
+    print(f"Migrated {len(prefixes)} prefix(es) from {LEGACY_PREFIX_FILE}")
+
+def _close():
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+def _read_setting(guild_id, key):
+    row = _connect().execute(
+        "SELECT value FROM guild_settings WHERE guild_id = ? AND key = ?", (guild_id, key)
+    ).fetchone()
+    return row[0] if row else None
+
+def _read_games():
+    return [row[0] for row in _connect().execute("SELECT state FROM game_sessions")]
+
+def _write_batch(settings, games):
+    # One transaction per batch: either every row lands or none do.
+    conn = _connect()
+    with conn:
+        conn.executemany(
+            "INSERT INTO guild_settings (guild_id, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (guild_id, key) DO UPDATE SET value = excluded.value",
+            [(guild_id, key, value) for (guild_id, key), value in settings.items()]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO game_sessions (session_id, state) VALUES (?, ?)",
+            [(session_id, state) for session_id, state in games.items() if state is not None]
+        )
+        conn.executemany(
+            "DELETE FROM game_sessions WHERE session_id = ?",
+            [(session_id,) for session_id, state in games.items() if state is None]
+        )
+
+def _read_state(key):
+    row = _connect().execute("SELECT value FROM bot_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def _write_state(key, value):
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO bot_state (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+def _write_moderation_log(entries):
+    conn = _connect()
+    with conn:
+        conn.executemany(
+            "INSERT INTO moderation_log (created_at, guild_id, moderator_id, target_id, action, outcome, reason) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            entries
+        )
+
+async def _run(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+async def init():
+    """Opens the database (and migrates prefixes.json if present) and starts the flusher."""
+    global _flush_wakeup, _flush_task
+    await _run(_connect)
+    _flush_wakeup = asyncio.Event()
+    _flush_task = asyncio.create_task(_flush_loop())
+
+async def close():
+    """Stops the flusher, writes any pending settings and closes the database."""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+    await flush()
+    await _run(_close)
+
+async def flush():
+    """Writes all dirty settings and game sessions in a single batch."""
+    if not _dirty and not _dirty_games:
+        return
+    settings, games = dict(_dirty), dict(_dirty_games)
+    versions = {key: _versions[key] for key in itertools.chain(settings, games)}
+    _dirty.clear()
+    _dirty_games.clear()
+    try:
+        await _run(_write_batch, settings, games)
+    except BaseException as e:
+        if isinstance(e, Exception):
+            print(f"Failed to flush {len(settings)} setting(s) and {len(games)} game(s): {e}")
+        _requeue(_dirty, settings, versions)
+        _requeue(_dirty_games, games, versions)
+        raise
+    for key, version in versions.items():
+        if _versions.get(key) == version:
+            del _versions[key]
 
-def _save_prefixes(prefixes):
-    with open(DB_FILE, 'w') as f:
-        json.dump(prefixes, f, indent=4)
+def _mark_dirty(dirty, key, value):
+    dirty[key] = value
+    _versions[key] = next(_write_counter)
+
+def _requeue(dirty, taken, versions):
+    # Only keys nobody wrote since; a newer value may even have been flushed already.
+    for key, value in taken.items():
+        if _versions.get(key) == versions[key]:
+            dirty[key] = value
+
+async def _flush_loop():
+    while True:
+        try:
+            await asyncio.wait_for(_flush_wakeup.wait(), timeout=FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _flush_wakeup.clear()
+        try:
+            await flush()
+        except Exception:
+            pass  # Already logged; the rows are retried on the next flush
+
+def invalidate(guild_id=None):
+    """Drops cached settings for one guild, or all guilds. Pending writes are kept."""
+    for cache_key in [k for k in _cache if guild_id is None or k[0] == guild_id]:
+        if cache_key not in _dirty:
+            del _cache[cache_key]
+
+async def get_setting(guild_id: int, key: str, default=None):
+    cache_key = (guild_id, key)
+    if cache_key in _cache:
+        value = _cache[cache_key]
+    else:
+        value = await _run(_read_setting, guild_id, key)
+        # A write may have landed in the cache while we were reading.
+        value = _cache.setdefault(cache_key, value)
+    return default if value is None else value
+
+async def set_setting(guild_id: int, key: str, value: str):
+    _cache[(guild_id, key)] = value
+    _mark_dirty(_dirty, (guild_id, key), value)
+    await _schedule_flush()
+
+async def _schedule_flush():
+    if _flush_task is None:
+        # No background flusher (e.g. used outside the bot): write through.
+        await flush()
+    elif len(_dirty) + len(_dirty_games) >= FLUSH_THRESHOLD:
+        _flush_wakeup.set()
+
+async def save_game(session_id: str, state: dict):
+    _mark_dirty(_dirty_games, session_id, json.dumps(state, separators=(",", ":")))
+    await _schedule_flush()
+
+async def delete_game(session_id: str):
+    _mark_dirty(_dirty_games, session_id, None)
+    await _schedule_flush()
+
+async def load_games():
+    """Returns the saved state of every in-progress game."""
+    await flush()
+    return [json.loads(state) for state in await _run(_read_games)]
 
 async def get_prefix(bot, message):
     # This function is typically used by discord.ext.commands.Bot for dynamic prefixes.
     # Since all commands are now slash commands, this function's primary use is for
     # compatibility or if prefix commands are re-introduced.
-    prefixes = _load_prefixes()
-    return prefixes.get(str(message.guild.id), 'py ')
+    if message.guild is None:
+        return DEFAULT_PREFIX
+    return await get_setting(message.guild.id, 'prefix', DEFAULT_PREFIX)
 
 async def set_prefix(guild_id: int, new_prefix: str):
-    prefixes = _load_prefixes()
-    prefixes[str(guild_id)] = new_prefix
-    _save_prefixes(prefixes)
+    await set_setting(guild_id, 'prefix', new_prefix)
+
+async def get_state(key: str, default=None):
+    """Reads a bot-wide value (not tied to a guild). Not cached; meant for rare lookups."""
+    value = await _run(_read_state, key)
+    return default if value is None else value
+
+async def set_state(key: str, value: str):
+    await _run(_write_state, key, value)
+
+async def log_moderation(entries):
+    """Appends (created_at, guild_id, moderator_id, target_id, action, outcome, reason) rows to the audit log.
+
+    Written straight away rather than batched with settings, so the log survives a crash.
+    """
+    if entries:
+        await _run(_write_moderation_log, entries)
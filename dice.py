@@ -0,0 +1,283 @@
+import os
+import re
+import math
+import random
+import asyncio
+from collections import namedtuple
+from functools import lru_cache
+
+import workers
+
+# Dice engine for /roll. Notation is compiled once into a plan of terms, e.g.
+# `4d6kh3 + 2d8! + 1d20r1 - 2`:
+#   NdM        N dice with M sides (`d20` = 1d20, `d%` = d100)
+#   khX / kX   keep the highest X     klX  keep the lowest X
+#   dhX / dlX  drop the highest/lowest X
+#   !  / !X    explode: roll again and add on M (or on X and above)
+#   rX         reroll dice showing X or lower, once
+# Every die is rolled for real while the per-invocation budget lasts. Larger
+# pools are drawn from their distribution instead: the sum from a normal
+# approximation, and keep/drop from a sampled histogram of faces.
+MAX_LENGTH = 200
+MAX_TERMS = 20
+MAX_DICE = 1_000_000_000
+MAX_SIDES = 10_000
+MAX_CONSTANT = 1_000_000_000
+MAX_EXPLOSIONS = 100        # Explosion rounds per term
+ROLL_BUDGET = int(os.getenv("DICE_ROLL_BUDGET", "200000"))  # Dice actually rolled per invocation
+SHOW_LIMIT = 50             # Terms with more dice are summarized
+INLINE_BUDGET = 1000        # Plans cheaper than this are rolled on the event loop
+TIMEOUT = float(os.getenv("DICE_TIMEOUT", "3"))
+
+class DiceError(ValueError):
+    pass
+
+# sides is None for a constant term, whose value is in `count`.
+# keep is ("h" | "l", n) or None; explode is the threshold or None; reroll is the highest value rerolled or None.
+Term = namedtuple("Term", "sign count sides keep explode reroll label")
+
+_TERM_RE = re.compile(r"\s*([+-])?\s*(?:(\d*)d(\d+|%)((?:kh|kl|dh|dl|k|!|r)\d*)*|(\d+))\s*")
+_MODIFIER_RE = re.compile(r"(kh|kl|dh|dl|k|!|r)(\d*)")
+_DICE_RE = re.compile(r"(\d*)d(\d+|%)")
+
+def _parse_dice(sign, count_text, sides_text, modifiers_text, label):
+    count = int(count_text) if count_text else 1
+    sides = 100 if sides_text == "%" else int(sides_text)
+    if not 1 <= count <= MAX_DICE:
+        raise DiceError(f"Number of dice must be between 1 and {MAX_DICE:,}.")
+    if not 1 <= sides <= MAX_SIDES:
+        raise DiceError(f"Dice must have between 1 and {MAX_SIDES:,} sides.")
+
+    keep = explode = reroll = None
+    for name, value in _MODIFIER_RE.findall(modifiers_text):
+        if name == "!":
+            if explode is not None:
+                raise DiceError("Only one explode modifier is allowed per term.")
+            explode = int(value) if value else sides
+            if not 2 <= explode <= sides:
+                raise DiceError(f"Dice can only explode on 2 to {sides}.")
+            continue
+        if not value:
+            raise DiceError(f"`{name}` needs a number, e.g. `{name}1`.")
+        n = int(value)
+        if name == "r":
+            if reroll is not None:
+                raise DiceError("Only one reroll modifier is allowed per term.")
+            if not 1 <= n < sides:
+                raise DiceError(f"Can only reroll values from 1 to {sides - 1}.")
+            reroll = n
+            continue
+        if keep is not None:
+            raise DiceError("Only one keep/drop modifier is allowed per term.")
+        if n > count:
+            raise DiceError(f"Cannot keep or drop {n} of {count} dice.")
+        # Drops are stored as the equivalent keep.
+        keep = {"kh": ("h", n), "k": ("h", n), "kl": ("l", n), "dh": ("l", count - n), "dl": ("h", count - n)}[name]
+    return Term(sign, count, sides, keep, explode, reroll, label)
+
+@lru_cache(maxsize=1024)
+def compile_plan(text):
+    """Parses dice notation into a tuple of Terms. Raises DiceError on invalid input."""
+    text = text.lower().strip()
+    if not text:
+        raise DiceError("Empty dice expression.")
+    if len(text) > MAX_LENGTH:
+        raise DiceError(f"Dice expression is longer than {MAX_LENGTH} characters.")
+
+    terms = []
+    position = 0
+    while position < len(text):
+        match = _TERM_RE.match(text, position)
+        if match is None or match.end() == position or (terms and not match.group(1)):
+            raise DiceError("Invalid dice format.")
+        sign = -1 if match.group(1) == "-" else 1
+        label = match.group(0).strip().lstrip("+-").strip()
+        if match.group(5) is not None:
+            value = int(match.group(5))
+            if value > MAX_CONSTANT:
+                raise DiceError("Modifier is too large.")
+            terms.append(Term(sign, value, None, None, None, None, label))
+        else:
+            modifiers_text = label[_DICE_RE.match(label).end():]
+            terms.append(_parse_dice(sign, match.group(2), match.group(3), modifiers_text, label))
+        position = match.end()
+        if len(terms) > MAX_TERMS:
+            raise DiceError(f"At most {MAX_TERMS} terms are allowed.")
+    if all(term.sides is None for term in terms):
+        raise DiceError("The expression has no dice.")
+    return tuple(terms)
+
+def _face_probabilities(term):
+    """P(face) for one die after rerolls, before explosions."""
+    sides, reroll = term.sides, term.reroll or 0
+    low = (reroll / sides) / sides
+    return [low if face <= reroll else 1 / sides + low for face in range(1, sides + 1)]
+
+def _die_moments(term):
+    """Mean and variance of a single die, including explosions (uncapped)."""
+    probabilities = _face_probabilities(term)
+    faces = range(1, term.sides + 1)
+    mean = sum(p * v for p, v in zip(probabilities, faces))
+    square = sum(p * v * v for p, v in zip(probabilities, faces))
+    if term.explode is None:
+        return mean, max(0.0, square - mean * mean)
+
+    # An explosion adds a chain Z = Y + [Y >= t] Z' of plain dice Y.
+    t, sides = term.explode, term.sides
+    q = (sides - t + 1) / sides
+    y_mean = (sides + 1) / 2
+    y_square = (sides + 1) * (2 * sides + 1) / 6
+    y_exploding = sum(range(t, sides + 1)) / sides            # E[Y * [Y >= t]]
+    z_mean = y_mean / (1 - q)
+    z_square = (y_square + 2 * y_exploding * z_mean) / (1 - q)
+    q0 = sum(probabilities[t - 1:])
+    x_exploding = sum(p * v for p, v in zip(probabilities[t - 1:], faces[t - 1:]))
+    total_mean = mean + q0 * z_mean
+    total_square = square + 2 * x_exploding * z_mean + q0 * z_square
+    return total_mean, max(0.0, total_square - total_mean * total_mean)
+
+def _binomial(n, p):
+    """Samples Binomial(n, p) without materializing n trials."""
+    if n <= 0 or p <= 0:
+        return 0
+    if p >= 1:
+        return n
+    if n <= 64:
+        return sum(random.random() < p for _ in range(n))
+    if n * p * (1 - p) > 100:
+        return min(n, max(0, round(random.gauss(n * p, math.sqrt(n * p * (1 - p))))))
+    if n * p > n * (1 - p):
+        return n - _binomial(n, 1 - p)
+    # Small mean: invert the CDF, walking the pmf up from k = 0.
+    u = random.random()
+    pmf = math.exp(n * math.log1p(-p))
+    cdf = pmf
+    k = 0
+    while u > cdf and k < n:
+        pmf *= (n - k) / (k + 1) * p / (1 - p)
+        k += 1
+        cdf += pmf
+    return k
+
+def _sample_histogram(term):
+    """Number of dice showing each face, drawn as a multinomial."""
+    remaining = term.count
+    mass = 1.0
+    counts = []
+    for p in _face_probabilities(term):
+        c = _binomial(remaining, min(1.0, p / mass)) if mass > 0 else 0
+        counts.append(c)
+        remaining -= c
+        mass -= p
+    counts[-1] += remaining
+    return counts
+
+def _roll_estimated(term):
+    """Total of a pool too large to roll die by die."""
+    if term.keep is None:
+        mean, variance = _die_moments(term)
+        total = round(random.gauss(term.count * mean, math.sqrt(term.count * variance)))
+        # Each die shows 1..sides, plus up to MAX_EXPLOSIONS extra rolls when exploding.
+        upper = term.count * term.sides * (1 if term.explode is None else MAX_EXPLOSIONS + 1)
+        return min(max(total, term.count), upper), "estimated from the distribution"
+    if term.explode is not None:
+        raise DiceError(f"Keep/drop with exploding dice is limited to {ROLL_BUDGET:,} dice per roll.")
+
+    which, n = term.keep
+    faces = list(enumerate(_sample_histogram(term), start=1))
+    if which == "h":
+        faces.reverse()
+    total = 0
+    for face, count in faces:
+        taken = min(count, n)
+        total += taken * face
+        n -= taken
+        if not n:
+            break
+    return total, f"kept {term.keep[1]:,} of {term.count:,}, sampled from the distribution"
+
+def _roll_dice(term):
+    """Rolls every die of `term`. Returns (values, exploded flags, kept indices, dice rolled)."""
+    faces = range(1, term.sides + 1)
+    values = random.choices(faces, k=term.count)
+    rolled = term.count
+    if term.reroll is not None:
+        low = [i for i, v in enumerate(values) if v <= term.reroll]
+        for i, v in zip(low, random.choices(faces, k=len(low))):
+            values[i] = v
+        rolled += len(low)
+
+    exploded = [False] * term.count
+    if term.explode is not None:
+        pending = [i for i, v in enumerate(values) if v >= term.explode]
+        for _ in range(MAX_EXPLOSIONS):
+            if not pending:
+                break
+            new_pending = []
+            for i, v in zip(pending, random.choices(faces, k=len(pending))):
+                values[i] += v
+                exploded[i] = True
+                if v >= term.explode:
+                    new_pending.append(i)
+            rolled += len(pending)
+            pending = new_pending
+
+    if term.keep is None:
+        kept = range(term.count)
+    else:
+        which, n = term.keep
+        order = sorted(range(term.count), key=values.__getitem__, reverse=(which == "h"))
+        kept = set(order[:n])
+    return values, exploded, kept, rolled
+
+def _format_dice(values, exploded, kept):
+    parts = []
+    for i, v in enumerate(values):
+        text = f"{v}!" if exploded[i] else str(v)
+        parts.append(text if i in kept else f"~~{text}~~")
+    return f"[{', '.join(parts)}]"
+
+def roll(text):
+    """Rolls dice notation. Returns (total, lines) with one description line per term."""
+    budget = ROLL_BUDGET
+    total = 0
+    lines = []
+    for term in compile_plan(text):
+        sign = "-" if term.sign < 0 else ""
+        if term.sides is None:
+            total += term.sign * term.count
+            lines.append(f"{sign}{term.label}")
+            continue
+        if term.count <= budget:
+            values, exploded, kept, rolled = _roll_dice(term)
+            budget -= rolled
+            subtotal = sum(values[i] for i in kept)
+            if term.count <= SHOW_LIMIT:
+                lines.append(f"{sign}`{term.label}` {_format_dice(values, exploded, kept)} = {subtotal}")
+            else:
+                detail = f"kept {len(kept):,} of {term.count:,} dice" if term.keep else f"{term.count:,} dice"
+                lines.append(f"{sign}`{term.label}` = {subtotal:,} ({detail})")
+        else:
+            subtotal, detail = _roll_estimated(term)
+            lines.append(f"{sign}`{term.label}` ≈ {subtotal:,} ({detail})")
+        total += term.sign * subtotal
+    return total, lines
+
+def _cost(plan):
+    return sum(term.count * (2 if term.explode or term.reroll else 1) for term in plan if term.sides is not None)
+
+async def roll_async(text):
+    """Rolls `text`, in the dice worker process unless the plan is tiny."""
+    plan = compile_plan(text)
+    if _cost(plan) <= INLINE_BUDGET:
+        return roll(text)
+    try:
+        return await workers.run("dice", roll, text, timeout=TIMEOUT)
+    except DiceError:
+        raise
+    except asyncio.TimeoutError:
+        raise DiceError("The roll took too long.")
+    except Exception as e:
+        # Crashed or restarted worker pool (e.g. another roll timed out)
+        print(f"Dice worker failed: {e!r}")
+        raise DiceError("The dice roller is unavailable right now. Please try again.")
@@ -0,0 +1,174 @@
+import os
+import json
+import random
+import asyncio
+from collections import OrderedDict, deque
+
+import aiohttp
+
+import http_client
+from caching import TTLCache
+
+# Pre-filled queue of random facts for /fact. Background workers keep the
+# queue topped up; each guild remembers the facts it was recently served so
+# repeats are avoided. Every fetched fact also goes into a bounded local
+# corpus (optionally persisted) that is used when the upstream is slow or down.
+QUEUE_SIZE = int(os.getenv("FACT_QUEUE_SIZE", "20"))
+REFILL_WORKERS = int(os.getenv("FACT_REFILL_WORKERS", "3"))
+RECENT_PER_GUILD = int(os.getenv("FACT_RECENT_PER_GUILD", "50"))
+WAIT_TIMEOUT = float(os.getenv("FACT_WAIT_TIMEOUT", "2"))
+CORPUS_MAX = int(os.getenv("FACT_CORPUS_MAX", "1000"))
+CORPUS_FILE = os.getenv("FACT_CORPUS_FILE")
+
+class _Recent:
+    """Bounded set of recently served fact IDs."""
+
+    def __init__(self, size):
+        self.order = deque(maxlen=size)
+        self.ids = set()
+
+    def __contains__(self, fact_id):
+        return fact_id in self.ids
+
+    def add(self, fact_id):
+        if fact_id in self.ids:
+            return
+        if len(self.order) == self.order.maxlen:
+            self.ids.discard(self.order[0])
+        self.order.append(fact_id)
+        self.ids.add(fact_id)
+
+class FactFeed:
+    def __init__(self, url, corpus_file=CORPUS_FILE):
+        self.url = url
+        self.corpus_file = corpus_file
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._queued_ids = set()
+        self._recent = TTLCache(10000, 86400)  # guild key -> _Recent
+        self.corpus = OrderedDict()  # fact id -> text
+        self._workers = []
+        self.served_from_queue = 0
+        self.served_from_corpus = 0
+        self.upstream_errors = 0
+
+    def start(self):
+        self._load_corpus()
+        self._workers = [asyncio.create_task(self._refill_worker()) for _ in range(REFILL_WORKERS)]
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await asyncio.to_thread(self._save_corpus)
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "corpus": len(self.corpus),
+            "served_from_queue": self.served_from_queue,
+            "served_from_corpus": self.served_from_corpus,
+            "upstream_errors": self.upstream_errors
+        }
+
+    async def get(self, guild_key):
+        """Returns (fact_id, text) not recently served to `guild_key`, or None if nothing is available."""
+        recent = self._recent.get(guild_key)
+        if recent is None:
+            recent = _Recent(RECENT_PER_GUILD)
+            self._recent.set(guild_key, recent)
+
+        # Don't wait on the network if the corpus can answer right away.
+        can_fall_back = any(fact_id not in recent for fact_id in self.corpus)
+        fact = await self._pop_unseen(recent, 0 if can_fall_back else WAIT_TIMEOUT)
+        if fact is not None:
+            self.served_from_queue += 1
+        else:
+            fact = self._from_corpus(recent)
+            if fact is None:
+                return None
+            self.served_from_corpus += 1
+        recent.add(fact[0])
+        return fact
+
+    async def _pop_unseen(self, recent, wait):
+        skipped = []
+        fact = None
+        try:
+            while True:
+                if self.queue.empty():
+                    if not wait:
+                        break
+                    candidate = await asyncio.wait_for(self.queue.get(), wait)
+                else:
+                    candidate = self.queue.get_nowait()
+                if candidate[0] not in recent:
+                    fact = candidate
+                    break
+                skipped.append(candidate)
+                if len(skipped) >= QUEUE_SIZE:
+                    break
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # Facts this guild has seen are still fresh for other guilds.
+            for candidate in skipped:
+                if self.queue.full():
+                    self._queued_ids.discard(candidate[0])
+                else:
+                    self.queue.put_nowait(candidate)
+        if fact is not None:
+            self._queued_ids.discard(fact[0])
+        return fact
+
+    def _from_corpus(self, recent):
+        unseen = [fact_id for fact_id in self.corpus if fact_id not in recent]
+        if not unseen:
+            return None
+        fact_id = random.choice(unseen)
+        return fact_id, self.corpus[fact_id]
+
+    async def _refill_worker(self):
+        backoff = 1.0
+        while True:
+            try:
+                data = await http_client.get_json(self.url)
+                fact = (str(data["id"]), data["text"])
+            except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, TypeError, ValueError) as e:
+                self.upstream_errors += 1
+                print(f"Failed to prefetch a fact: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+                continue
+            backoff = 1.0
+            self._remember(fact)
+            if fact[0] in self._queued_ids:
+                continue
+            self._queued_ids.add(fact[0])
+            await self.queue.put(fact)
+
+    def _remember(self, fact):
+        self.corpus[fact[0]] = fact[1]
+        self.corpus.move_to_end(fact[0])
+        while len(self.corpus) > CORPUS_MAX:
+            self.corpus.popitem(last=False)
+
+    def _load_corpus(self):
+        if not self.corpus_file:
+            return
+        try:
+            with open(self.corpus_file, 'r') as f:
+                for fact_id, text in json.load(f).items():
+                    self._remember((fact_id, text))
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError, AttributeError) as e:
+            print(f"Failed to load fact corpus: {e}")
+
+    def _save_corpus(self):
+        if not self.corpus_file:
+            return
+        tmp_path = f"{self.corpus_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.corpus, f)
+        os.replace(tmp_path, self.corpus_file)
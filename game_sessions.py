@@ -0,0 +1,63 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+
+# Registry of active game sessions. Sessions are any objects with a
+# `session_id`, a `last_active` timestamp and an async `expire(reason)`
+# method. The registry is capped; the least recently active game is ended
+# when a new one would exceed the cap.
+MAX_GAMES = int(os.getenv("TICTACTOE_MAX_GAMES", "500"))
+IDLE_TIMEOUT = float(os.getenv("TICTACTOE_IDLE_TIMEOUT", "600"))
+SWEEP_INTERVAL = 30
+
+class GameRegistry:
+    def __init__(self, max_games=MAX_GAMES, idle_timeout=IDLE_TIMEOUT):
+        self.max_games = max_games
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id):
+        return self._sessions.get(session_id)
+
+    def add(self, session):
+        """Registers a session and returns the sessions evicted to make room for it."""
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        evicted = []
+        while len(self._sessions) > self.max_games:
+            _, oldest = self._sessions.popitem(last=False)
+            evicted.append(oldest)
+        return evicted
+
+    def touch(self, session):
+        session.last_active = time.time()
+        if session.session_id in self._sessions:
+            self._sessions.move_to_end(session.session_id)
+
+    def remove(self, session_id):
+        self._sessions.pop(session_id, None)
+
+    def expired(self):
+        cutoff = time.time() - self.idle_timeout
+        stale = []
+        for session in self._sessions.values():
+            # Ordered by activity, so we can stop at the first fresh session.
+            if session.last_active > cutoff:
+                break
+            stale.append(session)
+        return stale
+
+async def run_sweeper(registry, interval=SWEEP_INTERVAL):
+    """Ends sessions that have been idle longer than the registry's timeout."""
+    while True:
+        await asyncio.sleep(interval)
+        for session in registry.expired():
+            registry.remove(session.session_id)
+            try:
+                await session.expire("Game ended due to timeout.")
+            except Exception as e:
+                print(f"Failed to expire game {session.session_id}: {e}")
@@ -0,0 +1,132 @@
+import os
+import time
+import asyncio
+import random
+from typing import Optional
+
+import aiohttp
+
+import metrics
+
+# Shared outbound HTTP client. Every call to a third-party API goes through the
+# single pooled session below so connections are reused and nothing blocks the
+# discord.py event loop.
+TOTAL_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10"))
+KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "8"))
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Requests that are safe to send twice. Anything else (POST) is only retried when
+# the connection could not be opened, since the server may already be acting on it.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+CONNECT_ERRORS = (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)
+
+_session: Optional[aiohttp.ClientSession] = None
+
+def _create_session():
+    connector = aiohttp.TCPConnector(
+        limit=POOL_LIMIT,
+        limit_per_host=POOL_LIMIT_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=300
+    )
+    timeout = aiohttp.ClientTimeout(total=TOTAL_TIMEOUT, connect=CONNECT_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+async def start():
+    """Opens the shared session. Called from the bot's setup_hook."""
+    get_session()
+
+async def close():
+    """Closes the shared session and its pooled connections."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+def get_session():
+    # Created lazily as well so helpers still work if start() was never called.
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+    return _session
+
+def _backoff_delay(attempt):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.0)
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return min(BACKOFF_MAX, max(0.0, float(value)))
+    except ValueError:
+        return None
+
+async def request(method, url, *, max_retries=None, retry_statuses=RETRY_STATUSES, **kwargs):
+    """Sends a request with retry/backoff and returns the open response.
+
+    Connection errors, timeouts and statuses in `retry_statuses` are retried
+    up to `max_retries` times; for non-idempotent methods only failures to
+    connect are. Any other error status raises
+    aiohttp.ClientResponseError. The caller must read or release the response.
+    """
+    started = time.perf_counter()
+    status = "cancelled"  # Unless we get further than that
+    try:
+        response = await _request_with_retries(method, url, max_retries, retry_statuses, **kwargs)
+        status = response.status
+        return response
+    except aiohttp.ClientResponseError as e:
+        status = e.status
+        raise
+    except Exception as e:
+        status = type(e).__name__
+        raise
+    finally:
+        metrics.observe_http(method, url, status, time.perf_counter() - started)
+
+async def _request_with_retries(method, url, max_retries, retry_statuses, **kwargs):
+    session = get_session()
+    retries = MAX_RETRIES if max_retries is None else max_retries
+    attempt = 0
+    while True:
+        delay = None
+        try:
+            response = await session.request(method, url, **kwargs)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if attempt >= retries:
+                raise
+            if method.upper() not in IDEMPOTENT_METHODS and not isinstance(e, CONNECT_ERRORS):
+                raise  # Read timeout or disconnect after the request was sent
+        else:
+            if response.status < 400:
+                return response
+            if response.status not in retry_statuses or attempt >= retries:
+                response.release()
+                response.raise_for_status()
+            delay = _retry_after(response)
+            response.release()
+        await asyncio.sleep(delay if delay is not None else _backoff_delay(attempt))
+        attempt += 1
+
+async def get_json(url, **kwargs):
+    response = await request("GET", url, **kwargs)
+    async with response:
+        return await response.json(content_type=None)
+
+async def get_text(url, **kwargs):
+    response = await request("GET", url, **kwargs)
+    async with response:
+        return await response.text()
+
+async def post_json(url, **kwargs):
+    response = await request("POST", url, **kwargs)
+    async with response:
+        return await response.json(content_type=None)
@@ -0,0 +1,106 @@
+import os
+import time
+import asyncio
+from collections import deque
+
+import aiohttp
+
+import http_client
+
+# Prefetched image URLs for the animal commands. Each animal type keeps a
+# bounded buffer that is refilled in batches whenever it drops below the low
+# watermark, so commands usually pop a URL without any upstream request.
+POOL_SIZE = int(os.getenv("IMAGE_POOL_SIZE", "20"))
+LOW_WATERMARK = int(os.getenv("IMAGE_POOL_LOW_WATERMARK", "5"))
+BATCH_SIZE = int(os.getenv("IMAGE_POOL_BATCH", "10"))
+
+class ImageSource:
+    def __init__(self, url_template, extract):
+        self.url_template = url_template  # Formatted with {count}
+        self.extract = extract            # Response JSON -> list of image URLs
+
+class _Buffer:
+    def __init__(self, source):
+        self.source = source
+        self.urls = deque(maxlen=POOL_SIZE)
+        self.refill_task = None
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.failures = 0
+        self.last_refill_latency = None
+        self.total_refill_latency = 0.0
+
+class ImagePool:
+    def __init__(self, sources):
+        self._buffers = {name: _Buffer(source) for name, source in sources.items()}
+
+    def start(self):
+        for name in self._buffers:
+            self._schedule_refill(name)
+
+    async def close(self):
+        tasks = [b.refill_task for b in self._buffers.values() if b.refill_task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def pop(self, name):
+        """Returns a buffered image URL, or None if the buffer is empty."""
+        buffer = self._buffers[name]
+        url = buffer.urls.popleft() if buffer.urls else None
+        if len(buffer.urls) < LOW_WATERMARK:
+            self._schedule_refill(name)
+        if url is None:
+            buffer.misses += 1
+        else:
+            buffer.hits += 1
+        return url
+
+    async def fetch_live(self, name):
+        """Fetches a single image URL directly, for when the buffer ran dry."""
+        urls = await self._fetch(self._buffers[name].source, 1)
+        return urls[0] if urls else None
+
+    def stats(self):
+        return {
+            name: {
+                "depth": len(buffer.urls),
+                "hits": buffer.hits,
+                "misses": buffer.misses,
+                "hit_rate": buffer.hits / (buffer.hits + buffer.misses) if buffer.hits + buffer.misses else None,
+                "refills": buffer.refills,
+                "refill_failures": buffer.failures,
+                "last_refill_latency": buffer.last_refill_latency,
+                "avg_refill_latency": buffer.total_refill_latency / buffer.refills if buffer.refills else None
+            }
+            for name, buffer in self._buffers.items()
+        }
+
+    def _schedule_refill(self, name):
+        buffer = self._buffers[name]
+        if buffer.refill_task is None or buffer.refill_task.done():
+            buffer.refill_task = asyncio.create_task(self._refill(name))
+
+    async def _refill(self, name):
+        buffer = self._buffers[name]
+        while len(buffer.urls) < POOL_SIZE:
+            count = min(BATCH_SIZE, POOL_SIZE - len(buffer.urls))
+            started = time.monotonic()
+            try:
+                urls = await self._fetch(buffer.source, count)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                buffer.failures += 1
+                print(f"Error prefetching {name} images: {e}")
+                return
+            latency = time.monotonic() - started
+            buffer.refills += 1
+            buffer.last_refill_latency = latency
+            buffer.total_refill_latency += latency
+            if not urls:
+                return
+            buffer.urls.extend(urls)
+
+    async def _fetch(self, source, count):
+        data = await http_client.get_json(source.url_template.format(count=count))
+        return [url for url in source.extract(data) if url]
@@ -1,16 +1,54 @@
+import time
+_startup_began = time.perf_counter()  # Before any other import, for the startup timing breakdown
+
 import os
-import json
+import asyncio
+import contextlib
+import io
+import math
+import secrets
 import base64
-import requests
+import aiohttp
 import discord
 import random # Added for animal commands
-import hashlib # Added for encrypt/decrypt commands
 from discord.ext import commands
 from dotenv import load_dotenv
-from cryptography.fernet import Fernet
-from ddgs import DDGS
 from typing import Optional
 import database # Added for setprefix command
+import http_client
+import chat_stream
+import conversation
+import response_cache
+import scheduler
+import model_loader
+import tictactoe_engine
+import board_engine
+import workers
+import game_sessions
+import image_pool
+import fact_feed
+import search_service
+import crypto_utils
+import calc_engine
+import dice
+import purge
+import moderation
+import command_sync
+import cluster
+import metrics
+import watchdog
+import profiling
+
+# Startup phases as (name, seconds), printed once the bot is ready
+startup_timings = [("imports", time.perf_counter() - _startup_began)]
+
+@contextlib.contextmanager
+def startup_phase(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings.append((name, time.perf_counter() - started))
 
 # Load environment variables
 load_dotenv()
@@ -20,65 +58,163 @@ TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
 # Bot setup
 intents = discord.Intents.default()
 intents.message_content = True  # Enable message content intent
-
-bot = commands.Bot(command_prefix=None, intents=intents, help_command=None)
+# Privileged; needed for the joined_within_minutes filter of /masskick and /massban
+intents.members = os.getenv("DISCORD_MEMBERS_INTENT", "0") == "1"
+
+class Pybot(commands.AutoShardedBot):
+    async def setup_hook(self):
+        # Everything between the end of the imports and here is mostly the login request.
+        startup_timings.append(("login", time.perf_counter() - _startup_began - sum(t for _, t in startup_timings)))
+        with startup_phase("http client"):
+            await http_client.start()
+        with startup_phase("database"):
+            await database.init()
+        with startup_phase("tictactoe table"):
+            tictactoe_engine.precompute()
+        with startup_phase("worker pools"):
+            await asyncio.to_thread(workers.start)
+        with startup_phase("restore games"):
+            await restore_tictactoe_games()
+            self.game_sweeper_task = asyncio.create_task(game_sessions.run_sweeper(tictactoe_games))
+        with startup_phase("chat history"):
+            await asyncio.to_thread(conversations.load)
+        with startup_phase("command sync"):
+            await sync_commands()
+        await cluster.start(cluster_stats)
+        metrics.instrument_tree(self.tree)
+        await metrics_server.start()
+        if watchdog.ENABLED:
+            watchdog.instrument_tree(self.tree)
+            loop_watchdog.start()
+        # Instructions come from the disk cache; the remote copy is revalidated after on_ready.
+        self.model_refresh_task = asyncio.create_task(model_loader.run_refresh_loop(self))
+        animal_images.start()
+        facts.start()
+        self.setup_finished = time.perf_counter()
+
+    async def close(self):
+        for task in (getattr(self, "model_refresh_task", None), getattr(self, "game_sweeper_task", None)):
+            if task is not None:
+                task.cancel()
+        await purge.cancel_all()
+        await cluster.stop()
+        await metrics_server.close()
+        loop_watchdog.stop()
+        profiling.stop()
+        await super().close()
+        await animal_images.close()
+        await facts.close()
+        await http_client.close()
+        await asyncio.to_thread(conversations.save)
+        workers.shutdown()
+        search_service.shutdown()
+        crypto_utils.shutdown()
+        print(f"Chat cache stats: {chat_cache.stats()}")
+        chat_cache.close()
+        await database.close()
+
+# In cluster mode (cluster.py) each process runs a fixed range of shards; otherwise sharding is automatic.
+bot = Pybot(command_prefix=None, intents=intents, help_command=None, shard_ids=cluster.SHARD_IDS, shard_count=cluster.SHARD_COUNT)
+
+def cluster_stats():
+    return {"guilds": len(bot.guilds), "shards": cluster.SHARD_IDS, "latency": bot.latency}
+
+# Local Prometheus endpoint; each cluster listens on METRICS_PORT + its cluster id.
+metrics_server = metrics.MetricsServer(port=metrics.PORT + (cluster.CLUSTER_ID or 0) if metrics.PORT else 0)
+metrics.Gauge("pybot_gateway_latency_seconds", "Average gateway heartbeat latency.",
+              lambda: bot.latency if math.isfinite(bot.latency) else None)
+metrics.Gauge("pybot_guilds", "Guilds handled by this process.", lambda: len(bot.guilds))
+
+# Reports callbacks that block the event loop (WATCHDOG=0 disables it)
+loop_watchdog = watchdog.Watchdog()
 
 # TogetherAI configuration
 API_URL = "https://api.together.xyz/v1/chat/completions"
-MODEL_FILE = "https://raw.githubusercontent.com/Hamzah82/pybot/main/Model_Encrypt.json"
-
-# Load model from URL Base64
-def load_model():
-    try:
-        response = requests.get(MODEL_FILE)
-        response.raise_for_status()
-        encoded_data = response.text
-        decoded_json = base64.b64decode(encoded_data).decode("utf-8")
-        return json.loads(decoded_json)
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Failed to fetch model: {e}")
-        return []
-    except Exception:
-        print("❌ Model corrupted or unreadable!")
-        return []
-
-# Load model instructions
-model_instructions = load_model()
-
-def chat_with_together(user_input):
-    system_message = model_instructions if isinstance(model_instructions, list) else []
-    messages = system_message + [{"role": "user", "content": user_input}]
 
+# Bot owner (Wokabi) for owner-only commands
+OWNER_ID = 758961658634043412
+
+CHAT_MODEL = "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free"
+CHAT_TEMPERATURE = 0.7
+# Stream /chat answers token by token; set CHAT_STREAMING=0 to wait for the full completion.
+CHAT_STREAMING = os.getenv("CHAT_STREAMING", "1") != "0"
+
+# Per-(user, channel) chat memory for /chat
+conversations = conversation.ConversationStore()
+# Shared answers for identical first-turn prompts
+chat_cache = response_cache.ResponseCache()
+# Concurrency, rate limits and fair queueing for Together API calls
+ai_scheduler = scheduler.AIScheduler()
+# 429s are retried by ai_scheduler so it can back off globally.
+CHAT_RETRY_STATUSES = http_client.RETRY_STATUSES - {429}
+# Completions can take longer than HTTP_TIMEOUT, so chat calls are bounded by how long
+# Together goes quiet (no headers or stream data) instead of by their total duration.
+CHAT_READ_TIMEOUT = float(os.getenv("CHAT_READ_TIMEOUT", "60"))
+CHAT_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=http_client.CONNECT_TIMEOUT, sock_read=CHAT_READ_TIMEOUT)
+
+def _chat_error(e):
+    # Timeouts stringify to an empty message.
+    if isinstance(e, asyncio.TimeoutError):
+        return "The AI took too long to respond. Please try again."
+    return f"An error occurred: {e}"
+
+def _system_messages():
+    return model_loader.get_instructions()
+
+def _build_chat_request(messages, stream=False):
     payload = {
-        "model": "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free",
+        "model": CHAT_MODEL,
         "messages": messages,
-        "temperature": 0.7
+        "temperature": CHAT_TEMPERATURE
     }
+    if stream:
+        payload["stream"] = True
 
     headers = {
         "Authorization": f"Bearer {TOGETHER_API_KEY}",
         "Content-Type": "application/json"
     }
-
+    return payload, headers
+
+async def chat_with_together(messages):
+    """Returns the AI response for a prepared message list. Raises aiohttp.ClientError on failure."""
+    payload, headers = _build_chat_request(messages)
+    result = await http_client.post_json(API_URL, json=payload, headers=headers, retry_statuses=CHAT_RETRY_STATUSES,
+                                         timeout=CHAT_TIMEOUT)
+    return result.get("choices", [{}])[0].get("message", {}).get("content", "An error occurred in AI response!")
+
+async def stream_chat_with_together(messages):
+    """Yields the AI response incrementally as content deltas arrive."""
+    payload, headers = _build_chat_request(messages, stream=True)
+    response = await http_client.request("POST", API_URL, json=payload, headers=headers, retry_statuses=CHAT_RETRY_STATUSES,
+                                         timeout=CHAT_TIMEOUT)
+    async with response:
+        async for delta in chat_stream.iter_sse_deltas(response):
+            yield delta
+
+async def sync_commands():
+    # Only sync when the command tree changed; set FORCE_COMMAND_SYNC=1 to sync anyway.
+    if cluster.CLUSTER_ID not in (None, 0):
+        return  # Commands are global; the first cluster syncs them
     try:
-        response = requests.post(API_URL, json=payload, headers=headers)
-        response.raise_for_status()
-        result = response.json()
-        return result.get("choices", [{}])[0].get("message", {}).get("content", "An error occurred in AI response!")
-    except requests.exceptions.RequestException as e:
-        return f"An error occurred: {e}"
-    except Exception as e:
-        return f"Unexpected error: {e}"
+        synced = await command_sync.sync_if_changed(bot.tree, bot.application_id, force=os.getenv("FORCE_COMMAND_SYNC") == "1")
+    except discord.HTTPException as e:
+        print(f"Failed to sync commands: {e}")
+        return
+    if synced is None:
+        print("Command tree unchanged, skipping sync")
+    else:
+        print(f"Synced {synced} command(s)")
 
 @bot.event
 async def on_ready():
+    # on_ready fires again after reconnects; commands were already synced in setup_hook.
     print(f'Logged in as {bot.user.name} ({bot.user.id})')
     print('------')
-    try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} command(s)")
-    except Exception as e:
-        print(e)
+    if getattr(bot, "setup_finished", None) is not None and not any(name == "gateway" for name, _ in startup_timings):
+        startup_timings.append(("gateway", time.perf_counter() - bot.setup_finished))
+        breakdown = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in startup_timings)
+        print(f"Startup took {time.perf_counter() - _startup_began:.2f}s ({breakdown})")
 
 @bot.tree.command(name="ping", description="Checks if the bot is alive.")
 @discord.app_commands.allowed_installs(guilds=True, users=True)
@@ -86,9 +222,15 @@ async def on_ready():
 async def ping(interaction: discord.Interaction):
     await interaction.response.send_message("Pong!")
 
+# Seconds the hard AI may think per move on boards larger than 3x3
+TICTACTOE_SEARCH_TIME = float(os.getenv("TICTACTOE_SEARCH_TIME", "1.5"))
+
 class TicTacToeGame:
-    def __init__(self, player1_id: int, player2_id: Optional[int] = None, difficulty: Optional[str] = None):
-        self.board = [" " for _ in range(9)]
+    def __init__(self, player1_id: int, player2_id: Optional[int] = None, difficulty: Optional[str] = None, size: int = 3, win_length: Optional[int] = None):
+        self.size = size
+        self.win_length = win_length or min(size, 4)
+        self.config = board_engine.get_config(self.size, self.win_length)  # Raises ValueError on bad sizes
+        self.board = [" " for _ in range(size * size)]
         self.game_over = False
 
         if player2_id and difficulty is None:
@@ -104,6 +246,34 @@ class TicTacToeGame:
         else:
             raise ValueError("Invalid game initialization. Provide either opponent or difficulty.")
 
+    def to_state(self):
+        """Compact, JSON-serializable snapshot of the game."""
+        state = {
+            "board": "".join(self.board),
+            "size": self.size,
+            "win_length": self.win_length,
+            "game_type": self.game_type,
+            "symbol": self.current_player_symbol
+        }
+        if self.game_type == "pvp":
+            state["players"] = list(self.players)
+            state["current"] = self.current_player_id
+        else:
+            state["player"] = self.player_id
+            state["difficulty"] = self.difficulty
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        if state["game_type"] == "pvp":
+            game = cls(state["players"][0], state["players"][1], size=state["size"], win_length=state["win_length"])
+            game.current_player_id = state["current"]
+        else:
+            game = cls(state["player"], difficulty=state["difficulty"], size=state["size"], win_length=state["win_length"])
+        game.board = list(state["board"])
+        game.current_player_symbol = state["symbol"]
+        return game
+
     def make_move(self, index, player_id=None):
         if self.game_type == "pvp":
             if player_id != self.current_player_id:
@@ -134,15 +304,7 @@ class TicTacToeGame:
         return False
 
     def check_winner(self, board):
-        winning_combinations = [
-            (0, 1, 2), (3, 4, 5), (6, 7, 8),  # Rows
-            (0, 3, 6), (1, 4, 7), (2, 5, 8),  # Columns
-            (0, 4, 8), (2, 4, 6)              # Diagonals
-        ]
-        for combo in winning_combinations:
-            if (board[combo[0]] == board[combo[1]] == board[combo[2]] != " "):
-                return True
-        return False
+        return self.config.is_win(board_engine.to_bits(board, "X")) or self.config.is_win(board_engine.to_bits(board, "O"))
 
     def check_draw(self, board):
         return " " not in board and not self.check_winner(board)
@@ -150,13 +312,13 @@ class TicTacToeGame:
     def get_empty_cells(self, board):
         return [i for i, cell in enumerate(board) if cell == " "]
 
-    def ai_move(self):
+    async def ai_move(self):
         if self.difficulty == "easy":
             return self._ai_move_easy()
         elif self.difficulty == "medium":
             return self._ai_move_medium()
         elif self.difficulty == "hard":
-            return self._ai_move_hard()
+            return await self._ai_move_hard()
 
     def _ai_move_easy(self):
         empty_cells = self.get_empty_cells(self.board)
@@ -175,18 +337,25 @@ class TicTacToeGame:
             return move
         return self._ai_move_easy()
 
-    def _ai_move_hard(self):
-        # Minimax algorithm
-        best_score = -float('inf')
-        best_move = None
-        for cell in self.get_empty_cells(self.board):
-            self.board[cell] = "O"
-            score = self._minimax(self.board, 0, False)
-            self.board[cell] = " "
-            if score > best_score:
-                best_score = score
-                best_move = cell
-        return best_move
+    async def _ai_move_hard(self):
+        if self.size == 3 and self.win_length == 3:
+            # Perfect play from the precomputed bitboard table
+            x_bits = tictactoe_engine.to_bits(self.board, "X")
+            o_bits = tictactoe_engine.to_bits(self.board, "O")
+            return tictactoe_engine.best_move(o_bits, x_bits)
+        # Larger boards: time-limited alpha-beta search in a worker process
+        try:
+            return await workers.run(
+                "games", board_engine.search_best_move,
+                list(self.board), self.size, self.win_length, "O", TICTACTOE_SEARCH_TIME,
+                timeout=TICTACTOE_SEARCH_TIME + 10
+            )
+        except asyncio.TimeoutError:
+            print("Tic-Tac-Toe search timed out, playing a medium move instead")
+        except Exception as e:
+            # Crashed or restarted worker pool
+            print(f"Tic-Tac-Toe search failed, playing a medium move instead: {e!r}")
+        return self._ai_move_medium()
 
     def _find_winning_move(self, player):
         for cell in self.get_empty_cells(self.board):
@@ -197,51 +366,86 @@ class TicTacToeGame:
             self.board[cell] = " "
         return None
 
-    def _minimax(self, board, depth, is_maximizing):
-        if self.check_winner(board):
-            return 1 if is_maximizing else -1
-        if self.check_draw(board):
-            return 0
-
-        if is_maximizing:
-            best_score = -float('inf')
-            for cell in self.get_empty_cells(board):
-                board[cell] = "O"
-                score = self._minimax(board, depth + 1, False)
-                board[cell] = " "
-                best_score = max(score, best_score)
-            return best_score
-        else:
-            best_score = float('inf')
-            for cell in self.get_empty_cells(board):
-                board[cell] = "X"
-                score = self._minimax(board, depth + 1, True)
-                board[cell] = " "
-                best_score = min(score, best_score)
-            return best_score
-
-    
+# Active games; views are persistent so games survive a restart.
+tictactoe_games = game_sessions.GameRegistry()
 
 class TicTacToeView(discord.ui.View):
-    def __init__(self, game: TicTacToeGame):
-        super().__init__(timeout=180)
+    def __init__(self, game: TicTacToeGame, session_id: Optional[str] = None):
+        super().__init__(timeout=None)
         self.game = game
+        self.session_id = session_id or secrets.token_hex(6)
         self.message = None
-        self.update_buttons()
-
-    def update_buttons(self):
-        self.clear_items()
-        for i in range(9):
+        self.guild_id = None
+        self.channel_id = None
+        self.message_id = None
+        self.last_active = time.time()
+        self.buttons = []
+        self.rendered = [None] * len(game.board)
+        for i in range(len(game.board)):
             button = discord.ui.Button(
-                label=self.game.board[i] if self.game.board[i] != " " else "\u200b",
+                label="\u200b",
                 style=discord.ButtonStyle.gray,
-                row=i // 3,
-                custom_id=f"tictactoe_{i}"
+                row=i // game.size,
+                custom_id=f"ttt:{self.session_id}:{i}"
             )
             button.callback = self.button_callback
-            if self.game.board[i] != " " or self.game.game_over:
-                button.disabled = True
+            self.buttons.append(button)
             self.add_item(button)
+        self.update_buttons()
+
+    def update_buttons(self):
+        # Only touch the buttons whose cell (or enabled state) changed.
+        for i, cell in enumerate(self.game.board):
+            button = self.buttons[i]
+            disabled = cell != " " or self.game.game_over
+            if cell != self.rendered[i] or button.disabled != disabled:
+                button.label = cell if cell != " " else "\u200b"
+                button.disabled = disabled
+                self.rendered[i] = cell
+
+    def to_state(self):
+        return dict(self.game.to_state(), id=self.session_id, guild_id=self.guild_id, channel_id=self.channel_id,
+                    message_id=self.message_id, last_active=self.last_active)
+
+    @classmethod
+    def from_state(cls, state):
+        view = cls(TicTacToeGame.from_state(state), state["id"])
+        view.guild_id = state.get("guild_id")
+        view.channel_id = state.get("channel_id")
+        view.message_id = state.get("message_id")
+        view.last_active = state.get("last_active", time.time())
+        return view
+
+    async def start_session(self, message):
+        self.message = message
+        self.guild_id = message.guild.id if message.guild else None
+        self.channel_id = message.channel.id
+        self.message_id = message.id
+        for evicted in tictactoe_games.add(self):
+            await evicted.expire("Game ended to make room for new games.")
+        await database.save_game(self.session_id, self.to_state())
+
+    async def end_session(self):
+        self.stop()
+        tictactoe_games.remove(self.session_id)
+        await database.delete_game(self.session_id)
+
+    async def expire(self, reason):
+        self.game.game_over = True
+        self.update_buttons()
+        await self.end_session()
+        # Prefer editing through the channel; the interaction token behind self.message expires after 15 minutes.
+        candidates = []
+        if self.channel_id and self.message_id:
+            candidates.append(bot.get_partial_messageable(self.channel_id).get_partial_message(self.message_id))
+        if self.message is not None:
+            candidates.append(self.message)
+        for message in candidates:
+            try:
+                await message.edit(content=reason, view=self)
+                return
+            except discord.HTTPException:
+                continue # Deleted, no access, or token expired
 
     async def button_callback(self, interaction: discord.Interaction):
         if self.game.game_type == "pvp":
@@ -263,8 +467,9 @@ class TicTacToeView(discord.ui.View):
             player_id_for_move = None # Not used for PVE make_move
             current_player_display = f"It's {self.game.current_player_symbol}'s turn."
 
-        index = int(interaction.data["custom_id"].split("_")[1])
+        index = int(interaction.data["custom_id"].rsplit(":", 1)[1])
         if self.game.make_move(index, player_id_for_move):
+            tictactoe_games.touch(self)
             self.update_buttons()
             if self.game.check_winner(self.game.board):
                 if self.game.game_type == "pvp":
@@ -272,10 +477,10 @@ class TicTacToeView(discord.ui.View):
                     await interaction.response.edit_message(content=f"<@{winner_id}> ({self.game.players[winner_id]}) wins!", view=self)
                 else:
                     await interaction.response.edit_message(content=f"Player {self.game.current_player_symbol} wins!", view=self)
-                self.stop()
+                await self.end_session()
             elif self.game.check_draw(self.game.board):
                 await interaction.response.edit_message(content="It's a draw!", view=self)
-                self.stop()
+                await self.end_session()
             else:
                 # Re-evaluate current_player_display AFTER the move has been made and turn switched
                 if self.game.game_type == "pvp":
@@ -286,43 +491,72 @@ class TicTacToeView(discord.ui.View):
                 await interaction.response.edit_message(content=f"It's {next_player_display}'s turn.", view=self)
                 
                 if self.game.game_type == "pve" and self.game.current_player_symbol == "O": # AI's turn
-                    await self.message.edit(content="AI's turn...")
-                    ai_move_index = self.game.ai_move()
-                    if ai_move_index is not None:
-                        self.game.make_move(ai_move_index)
-                        self.update_buttons()
-                        if self.game.check_winner(self.game.board):
-                            await self.message.edit(content=f"AI wins!", view=self)
-                            self.stop()
-                        elif self.game.check_draw(self.game.board):
-                            await self.message.edit(content="It's a draw!", view=self)
-                            self.stop()
-                        else:
-                            # After AI move, it's human's turn again (X)
-                            await self.message.edit(content=f"It's {self.game.current_player_symbol}'s turn.", view=self)
+                    # edit_original_response targets this game message, even for games restored after a restart.
+                    try:
+                        await interaction.edit_original_response(content="AI's turn...")
+                    except discord.HTTPException:
+                        pass # Only a status line; the AI must still move
+                    ai_move_index = await self.game.ai_move()
+                    if ai_move_index is None or not self.game.make_move(ai_move_index):
+                        # Never leave the game stuck on the AI's turn
+                        self.game.current_player_symbol = "X"
+                    self.update_buttons()
+                    if self.game.check_winner(self.game.board):
+                        await interaction.edit_original_response(content=f"AI wins!", view=self)
+                        await self.end_session()
+                        return
+                    elif self.game.check_draw(self.game.board):
+                        await interaction.edit_original_response(content="It's a draw!", view=self)
+                        await self.end_session()
+                        return
+                    else:
+                        # After AI move, it's human's turn again (X)
+                        await interaction.edit_original_response(content=f"It's {self.game.current_player_symbol}'s turn.", view=self)
+                await database.save_game(self.session_id, self.to_state())
         else:
             await interaction.response.send_message("This cell is already taken or the game is over.", ephemeral=True)
 
-    async def on_timeout(self):
-        for item in self.children:
-            item.disabled = True
-        await self.message.edit(content="Game ended due to timeout.", view=self)
+async def restore_tictactoe_games():
+    """Re-attaches persistent views for games that were in progress before a restart."""
+    states = sorted(await database.load_games(), key=lambda state: state.get("last_active", 0))
+    for state in states:
+        if not cluster.owns_guild(state.get("guild_id")):
+            continue  # Another cluster's shards receive this game's interactions
+        try:
+            view = TicTacToeView.from_state(state)
+        except (KeyError, ValueError) as e:
+            print(f"Dropping unreadable game {state.get('id')}: {e}")
+            await database.delete_game(state.get("id"))
+            continue
+        bot.add_view(view, message_id=view.message_id)
+        for evicted in tictactoe_games.add(view):
+            await evicted.expire("Game ended to make room for new games.")
 
 @bot.tree.command(name="tictactoe", description="Starts a Tic-Tac-Toe game.")
 @discord.app_commands.allowed_installs(guilds=True, users=True)
 @discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 @discord.app_commands.describe(
-    opponent="The user you want to play against (leave empty to play against AI)."
+    opponent="The user you want to play against (leave empty to play against AI).",
+    size="Board size (default: 3x3).",
+    win_length="How many in a row are needed to win (default: 3 on 3x3, otherwise 4)."
 )
 @discord.app_commands.choices(difficulty=[
     discord.app_commands.Choice(name="Easy", value="easy"),
     discord.app_commands.Choice(name="Medium", value="medium"),
     discord.app_commands.Choice(name="Hard", value="hard"),
+], size=[
+    discord.app_commands.Choice(name="3x3", value=3),
+    discord.app_commands.Choice(name="4x4", value=4),
+    discord.app_commands.Choice(name="5x5", value=5),
 ])
-async def tictactoe(interaction: discord.Interaction, opponent: Optional[discord.User] = None, difficulty: Optional[discord.app_commands.Choice[str]] = None):
+async def tictactoe(interaction: discord.Interaction, opponent: Optional[discord.User] = None, difficulty: Optional[discord.app_commands.Choice[str]] = None, size: Optional[discord.app_commands.Choice[int]] = None, win_length: Optional[discord.app_commands.Range[int, 3, 5]] = None):
     if opponent and difficulty:
         await interaction.response.send_message("You cannot specify both an opponent and a difficulty. Please choose one mode.", ephemeral=True)
         return
+    board_size = size.value if size else 3
+    if win_length is not None and win_length > board_size:
+        await interaction.response.send_message("The win length cannot be larger than the board size.", ephemeral=True)
+        return
 
     if opponent:
         if opponent.bot:
@@ -331,22 +565,18 @@ async def tictactoe(interaction: discord.Interaction, opponent: Optional[discord
         if opponent.id == interaction.user.id:
             await interaction.response.send_message("You cannot play against yourself!", ephemeral=True)
             return
-        game = TicTacToeGame(interaction.user.id, opponent.id)
+        game = TicTacToeGame(interaction.user.id, opponent.id, size=board_size, win_length=win_length)
         view = TicTacToeView(game)
         await interaction.response.send_message(f"Tic-Tac-Toe started! <@{interaction.user.id}> (X) vs <@{opponent.id}> (O). It's <@{game.current_player_id}>'s turn.", view=view)
     elif difficulty:
-        game = TicTacToeGame(interaction.user.id, difficulty=difficulty.value)
+        game = TicTacToeGame(interaction.user.id, difficulty=difficulty.value, size=board_size, win_length=win_length)
         view = TicTacToeView(game)
         await interaction.response.send_message(f"Tic-Tac-Toe started! You (X) vs AI (O). It's your turn.", view=view)
     else:
         await interaction.response.send_message("Please specify either an opponent or a difficulty to start the game.", ephemeral=True)
         return
 
-    view.message = await interaction.original_response()
-    game = TicTacToeGame(difficulty.value)
-    view = TicTacToeView(game, interaction.user.id)
-    await interaction.response.send_message(f"Tic-Tac-Toe started! It's {game.current_player}'s turn.", view=view)
-    view.message = await interaction.original_response()
+    await view.start_session(await interaction.original_response())
 
 
 @bot.tree.command(name="invite", description="Generates a Discord server invite link.")
@@ -382,17 +612,22 @@ async def invite(
     except Exception as e:
         await interaction.response.send_message(f"An error occurred while creating the invite: {e}", ephemeral=True)
 
+FACT_API_URL = "https://uselessfacts.jsph.pl/random.json?language=en"
+# Pre-fetched, de-duplicated facts for /fact
+facts = fact_feed.FactFeed(FACT_API_URL)
+
 @bot.tree.command(name="fact", description="Generates a random interesting fact.")
 @discord.app_commands.allowed_installs(guilds=True, users=True)
 @discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 async def fact(interaction: discord.Interaction):
+    # Repeats are avoided per server (or per user outside servers).
+    guild_key = interaction.guild_id or f"user:{interaction.user.id}"
     try:
-        response = requests.get("https://uselessfacts.jsph.pl/random.json?language=en")
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        data = response.json()
-        await interaction.response.send_message(f"**Random Fact:** {data['text']}")
-    except requests.exceptions.RequestException as e:
-        await interaction.response.send_message(f"Failed to fetch a fact: {e}", ephemeral=True)
+        result = await facts.get(guild_key)
+        if result is None:
+            await interaction.response.send_message("Failed to fetch a fact: the fact service is unavailable right now.", ephemeral=True)
+            return
+        await interaction.response.send_message(f"**Random Fact:** {result[1]}")
     except Exception as e:
         await interaction.response.send_message(f"An unexpected error occurred: {e}", ephemeral=True)
 
@@ -400,44 +635,44 @@ async def fact(interaction: discord.Interaction):
 DOG_API_URL = "https://dog.ceo/api/breeds/image/random"
 CAT_API_URL = "https://api.thecatapi.com/v1/images/search"
 
+# Prefetched image URLs for /dog, /cat and /random
+animal_images = image_pool.ImagePool({
+    'dog': image_pool.ImageSource(DOG_API_URL + "/{count}", lambda data: data.get('message') or []),
+    'cat': image_pool.ImageSource(CAT_API_URL + "?limit={count}", lambda data: [item.get('url') for item in data]),
+})
+
 # --- HELPER FUNCTION for animal commands ---
 async def fetch_and_send_animal(interaction: discord.Interaction, animal_type: str):
     """A helper function to fetch and send an animal picture."""
-    await interaction.response.defer(thinking=True)
+    if animal_type == 'dog':
+        title = "Woof! Here's a random doggo!"
+        color = discord.Color.blue()
+    elif animal_type == 'cat':
+        title = "Meow! Here's a random kitty!"
+        color = discord.Color.orange()
+    else:
+        await interaction.response.send_message("Sorry, I don't know that animal.")
+        return
 
-    try:
-        if animal_type == 'dog':
-            api_url = DOG_API_URL
-            title = "Woof! Here's a random doggo!"
-            color = discord.Color.blue()
-        elif animal_type == 'cat':
-            api_url = CAT_API_URL
-            title = "Meow! Here's a random kitty!"
-            color = discord.Color.orange()
-        else:
-            await interaction.followup.send("Sorry, I don't know that animal.")
+    # Buffered URLs are answered immediately; only an empty buffer needs a live request.
+    image_url = animal_images.pop(animal_type)
+    if image_url is None:
+        await interaction.response.defer(thinking=True)
+        try:
+            image_url = await animal_images.fetch_live(animal_type)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            print(f"Error fetching {animal_type} image: {e}")
+            await interaction.followup.send(f"Sorry, I couldn't fetch a {animal_type} picture right now.")
             return
 
-        response = requests.get(api_url)
-        response.raise_for_status()
-        data = response.json()
-
-        if animal_type == 'dog':
-            image_url = data.get('message')
-        elif animal_type == 'cat':
-            image_url = data[0].get('url')
-
-        if image_url:
-            embed = discord.Embed(title=title, color=color)
-            embed.set_image(url=image_url)
-            embed.set_footer(text=f"Powered by {animal_type} APIs")
-            await interaction.followup.send(embed=embed)
-        else:
-            await interaction.followup.send("Sorry, the API didn't provide an image URL.")
-
-    except requests.RequestException as e:
-        print(f"Error fetching {animal_type} image: {e}")
-        await interaction.followup.send(f"Sorry, I couldn't fetch a {animal_type} picture right now.")
+    send = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+    if image_url:
+        embed = discord.Embed(title=title, color=color)
+        embed.set_image(url=image_url)
+        embed.set_footer(text=f"Powered by {animal_type} APIs")
+        await send(embed=embed)
+    else:
+        await send("Sorry, the API didn't provide an image URL.")
 
 @bot.tree.command(name="dog", description="Fetches a random picture of a dog.")
 @discord.app_commands.allowed_installs(guilds=True, users=True)
@@ -471,25 +706,35 @@ async def help_command(interaction: discord.Interaction):
 
 **Slash Commands (`/`):**
 `/ping` - Checks if the bot is alive.
-`/tictactoe [opponent|difficulty]` - Starts a Tic-Tac-Toe game against AI or another player.
+`/tictactoe [opponent|difficulty] [size] [win_length]` - Starts a Tic-Tac-Toe game (3x3 to 5x5) against AI or another player.
 `/invite` - Generates a Discord server invite link.
 `/fact` - Generates a random interesting fact.
 `/dog` - Fetches a random picture of a dog.
 `/cat` - Fetches a random picture of a cat.
 `/random` - Fetches a random picture of a cat OR a dog.
 `/spoof <message>` - Sends a message as the bot (Wokabi 758961658634043412 only).
-`/roll <dice_string>` - Rolls dice (example: `/roll 2d6+3`).
+`/reloadmodel [force]` - Reloads the AI system prompt (Wokabi 758961658634043412 only).
+`/roll <dice_string>` - Rolls dice (examples: `/roll 2d6+3`, `/roll 4d6kh3`, `/roll 3d6!`, `/roll 2d20kl1`, `/roll 1d20r1`).
 `/base64encode <text>` - Encodes text to Base64.
 `/base64decode <text>` - Decodes text from Base64.
-`/calc <expression>` - Evaluates a mathematical expression (example: `/calc 10*5+2`).
+`/calc <expression>` - Evaluates a mathematical expression (example: `/calc 10*5+2`, `/calc r = 2; pi * r^2`, `/calc sqrt(2)`).
 `/encrypt <passphrase> <text>` - Encrypts text using a passphrase.
 `/decrypt <passphrase> <encrypted_text>` - Decrypts text using a passphrase.
 `/search <query>` - Searches on DuckDuckGo.
 `/chat <message>` - Interacts with the AI.
-`/clear [amount]` - Clears messages in the channel (default 100, max 1000).
+`/forget` - Clears your /chat conversation memory in this channel.
+`/clear [amount] [author] [contains] [max_age_hours]` - Clears messages in the channel in the background (default 100, max 10000).
 `/setprefix <new_prefix>` - Sets a custom prefix for this server.
 `/kick <member> [reason]` - Kicks a member from the server.
 `/ban <member> [reason]` - Bans a member from the server.
+`/masskick [targets] [joined_within_minutes] [reason]` - Kicks many members at once (mentions or IDs).
+`/massban [targets] [joined_within_minutes] [delete_message_hours] [reason]` - Bans many users at once (mentions or IDs).
+`/stats` - Shows bot performance stats (owner only).
+`/blocking [stack]` - Shows what blocked the event loop the most (owner only).
+`/profile [mode] [seconds]` - Profiles the event loop and attaches the report (owner only).
+`/profilestop` - Ends the running profile early (owner only).
+`/memory <action>` - Takes tracemalloc snapshots and diffs (owner only).
+`/tasks` - Lists asyncio tasks and where they are waiting (owner only).
 `/help` - Displays this command list.
     """
     await interaction.response.send_message(help_message)
@@ -499,40 +744,161 @@ async def help_command(interaction: discord.Interaction):
 @discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 async def spoof(interaction: discord.Interaction, message: str):
     # Replace 108 with the actual user ID of Wokabi 108
-    if interaction.user.id == 758961658634043412:
+    if interaction.user.id == OWNER_ID:
         await interaction.response.send_message(message)
     else:
         await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
 
-@bot.tree.command(name="roll", description="Rolls dice (example: /roll 2d6+3).")
+@bot.tree.command(name="reloadmodel", description="Reloads the AI system prompt (Wokabi 758961658634043412 only).")
 @discord.app_commands.allowed_installs(guilds=True, users=True)
 @discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
-async def roll(interaction: discord.Interaction, dice_string: str):
+async def reloadmodel(interaction: discord.Interaction, force: Optional[bool] = False):
+    if interaction.user.id != OWNER_ID:
+        await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+    if await model_loader.refresh(force=force):
+        await interaction.followup.send(f"Model reloaded ({len(model_loader.get_instructions())} message(s)).", ephemeral=True)
+    else:
+        await interaction.followup.send("Model unchanged (not modified or fetch failed, see logs).", ephemeral=True)
+
+@bot.tree.command(name="stats", description="Shows bot performance stats (Wokabi 758961658634043412 only).")
+@discord.app_commands.allowed_installs(guilds=True, users=True)
+@discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+async def stats(interaction: discord.Interaction):
+    if interaction.user.id != OWNER_ID:
+        await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+        return
+    lines = [f"Gateway latency: {bot.latency * 1000:.0f}ms, guilds: {len(bot.guilds)}"] if math.isfinite(bot.latency) else []
+    lines += metrics.summary()
+    lines.append(f"Chat cache: {chat_cache.stats()}")
+    lines.append(f"AI scheduler: {ai_scheduler.stats()}")
+    lines.append(f"Animal images: {animal_images.stats()}")
+    lines.append(f"Facts: {facts.stats()}")
+    for cluster_id, info in sorted(cluster.cluster_stats.items()):
+        lines.append(f"Cluster {cluster_id}: {info.get('guilds')} guilds, {info.get('latency', 0) * 1000:.0f}ms")
+    await interaction.response.defer(ephemeral=True)
+    for chunk in chat_stream.split_message("\n".join(lines)):
+        await interaction.followup.send(chunk, ephemeral=True)
+
+@bot.tree.command(name="blocking", description="Shows what blocked the event loop the most (Wokabi 758961658634043412 only).")
+@discord.app_commands.allowed_installs(guilds=True, users=True)
+@discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+@discord.app_commands.describe(stack="Also attach the last stack captured for offender number N.")
+async def blocking(interaction: discord.Interaction, stack: Optional[int] = None):
+    if interaction.user.id != OWNER_ID:
+        await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+        return
+    if not watchdog.ENABLED:
+        await interaction.response.send_message("The watchdog is disabled (WATCHDOG=0).", ephemeral=True)
+        return
+    offenders = loop_watchdog.top()
+    if not offenders:
+        await interaction.response.send_message(f"No stalls over {watchdog.THRESHOLD * 1000:.0f}ms recorded.", ephemeral=True)
+        return
+    lines = [f"{loop_watchdog.stalls} stall(s) over {watchdog.THRESHOLD * 1000:.0f}ms. Worst offenders (count, total, max):"]
+    for number, offender in enumerate(offenders, start=1):
+        lines.append(f"{number}. {offender.command} at `{offender.location}`: {offender.count}, "
+                     f"{offender.total:.2f}s, {offender.max:.2f}s")
+    message = "\n".join(lines)[:chat_stream.MESSAGE_LIMIT]
+    if stack is not None and 1 <= stack <= len(offenders):
+        offender = offenders[stack - 1]
+        stack_file = discord.File(io.BytesIO(f"{offender.last_tag}\n\n{offender.last_stack}".encode()), filename="stack.txt")
+        await interaction.response.send_message(message, file=stack_file, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+
+def _report_files(files):
+    return [discord.File(io.BytesIO(data), filename=name) for name, data in files.items()]
+
+@bot.tree.command(name="profile", description="Profiles the event loop for N seconds (Wokabi 758961658634043412 only).")
+@discord.app_commands.allowed_installs(guilds=True, users=True)
+@discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+@discord.app_commands.describe(
+    mode="Sampling (default) is cheap and shows where time goes; cProfile counts every call but slows the bot down.",
+    seconds="How long to profile (default: 30). /profilestop ends it early."
+)
+@discord.app_commands.choices(mode=[
+    discord.app_commands.Choice(name="Sampling", value="sampling"),
+    discord.app_commands.Choice(name="cProfile", value="cprofile"),
+])
+async def profile_command(interaction: discord.Interaction, mode: Optional[discord.app_commands.Choice[str]] = None, seconds: Optional[discord.app_commands.Range[int, 1, int(profiling.MAX_SECONDS)]] = 30):
+    if interaction.user.id != OWNER_ID:
+        await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    try:
+        summary, files = await profiling.profile(mode.value if mode else "sampling", seconds)
+    except profiling.ProfilingError as e:
+        await interaction.followup.send(str(e), ephemeral=True)
+        return
+    await interaction.followup.send(summary[:chat_stream.MESSAGE_LIMIT], files=_report_files(files), ephemeral=True)
+
+@bot.tree.command(name="profilestop", description="Ends the running /profile early (Wokabi 758961658634043412 only).")
+@discord.app_commands.allowed_installs(guilds=True, users=True)
+@discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+async def profilestop(interaction: discord.Interaction):
+    if interaction.user.id != OWNER_ID:
+        await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+        return
+    if profiling.stop():
+        await interaction.response.send_message("Stopping the profiler; the results will be posted as the /profile reply.", ephemeral=True)
+    else:
+        await interaction.response.send_message("No profile is running.", ephemeral=True)
+
+@bot.tree.command(name="memory", description="Takes tracemalloc snapshots and diffs (Wokabi 758961658634043412 only).")
+@discord.app_commands.allowed_installs(guilds=True, users=True)
+@discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+@discord.app_commands.describe(action="Snapshot starts tracing and sets the baseline, Diff compares against it, Stop ends tracing.")
+@discord.app_commands.choices(action=[
+    discord.app_commands.Choice(name="Snapshot", value="snapshot"),
+    discord.app_commands.Choice(name="Diff", value="diff"),
+    discord.app_commands.Choice(name="Stop", value="stop"),
+])
+async def memory_command(interaction: discord.Interaction, action: discord.app_commands.Choice[str]):
+    if interaction.user.id != OWNER_ID:
+        await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+        return
+    if action.value == "stop":
+        stopped = profiling.memory_stop()
+        await interaction.response.send_message("Stopped tracemalloc." if stopped else "tracemalloc is not running.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
     try:
-        parts = dice_string.lower().split('d')
-        num_dice = int(parts[0])
-        
-        if '+' in parts[1]:
-            die_type, modifier = map(int, parts[1].split('+'))
-        elif '-' in parts[1]:
-            die_type, modifier = map(int, parts[1].split('-'))
-            modifier = -modifier
+        if action.value == "snapshot":
+            summary, files = await profiling.memory_snapshot()
         else:
-            die_type = int(parts[1])
-            modifier = 0
+            summary, files = await profiling.memory_diff()
+    except profiling.ProfilingError as e:
+        await interaction.followup.send(str(e), ephemeral=True)
+        return
+    await interaction.followup.send(summary[:chat_stream.MESSAGE_LIMIT], files=_report_files(files), ephemeral=True)
 
-        if num_dice <= 0 or die_type <= 0:
-            await interaction.response.send_message("Number of dice and die type must be greater than 0.", ephemeral=True)
-            return
+@bot.tree.command(name="tasks", description="Lists asyncio tasks and where they are waiting (Wokabi 758961658634043412 only).")
+@discord.app_commands.allowed_installs(guilds=True, users=True)
+@discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+async def tasks_command(interaction: discord.Interaction):
+    if interaction.user.id != OWNER_ID:
+        await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+        return
+    summary, files = profiling.dump_tasks()
+    await interaction.response.send_message(summary[:chat_stream.MESSAGE_LIMIT], files=_report_files(files), ephemeral=True)
 
-        rolls = [random.randint(1, die_type) for _ in range(num_dice)]
-        total = sum(rolls) + modifier
+@bot.tree.command(name="roll", description="Rolls dice (example: /roll 2d6+3).")
+@discord.app_commands.allowed_installs(guilds=True, users=True)
+@discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+async def roll(interaction: discord.Interaction, dice_string: str):
+    try:
+        total, lines = await dice.roll_async(dice_string)
+    except dice.DiceError as e:
+        await interaction.response.send_message(f"{e} Example: `/roll 2d6`, `/roll 1d20+5` or `/roll 4d6kh3`.", ephemeral=True)
+        return
 
-        await interaction.response.send_message(f"Roll: {rolls}, Total: {total}")
-    except ValueError:
-        await interaction.response.send_message("Invalid dice format. Example: `/roll 2d6` or `/roll 1d20+5`.", ephemeral=True)
-    except Exception as e:
-        await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
+    message = "\n".join(lines) + f"\n**Total: {total:,}**"
+    if len(message) > chat_stream.MESSAGE_LIMIT:
+        # Long dice lists are dropped; the total is what matters
+        message = f"**Total: {total:,}**"
+    await interaction.response.send_message(message)
 
 @bot.tree.command(name="base64encode", description="Encodes text to Base64.")
 @discord.app_commands.allowed_installs(guilds=True, users=True)
@@ -557,25 +923,20 @@ async def base64decode(interaction: discord.Interaction, text: str):
 @discord.app_commands.allowed_installs(guilds=True, users=True)
 @discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 async def calc(interaction: discord.Interaction, expression: str):
+    # Parsed against a whitelist and evaluated in a worker process, never with eval()
     try:
-        # Only allow basic mathematical operations for security
-        allowed_chars = "0123456789+-*/(). "
-        if not all(c in allowed_chars for c in expression):
-            await interaction.response.send_message("Invalid expression. Only numbers and basic operators (+-*/()) are allowed.", ephemeral=True)
-            return
-        result = eval(expression)
-        await interaction.response.send_message(f"Result: {result}")
-    except Exception:
-        await interaction.response.send_message("Invalid mathematical expression.", ephemeral=True)
+        result = await calc_engine.evaluate_async(expression)
+    except calc_engine.CalcError as e:
+        await interaction.response.send_message(f"Invalid expression: {e}", ephemeral=True)
+        return
+    await interaction.response.send_message(f"Result: {result}")
 
 @bot.tree.command(name="encrypt", description="Encrypts text using a passphrase.")
 @discord.app_commands.allowed_installs(guilds=True, users=True)
 @discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 async def encrypt(interaction: discord.Interaction, passphrase: str, text: str):
     try:
-        key = base64.urlsafe_b64encode(hashlib.sha256(passphrase.encode()).digest())
-        f = Fernet(key)
-        encrypted_text = f.encrypt(text.encode()).decode()
+        encrypted_text = await crypto_utils.encrypt(interaction.user.id, passphrase, text)
         await interaction.response.send_message(f"Encrypted: ```{encrypted_text}```")
     except Exception as e:
         await interaction.response.send_message(f"Failed to encrypt: {e}", ephemeral=True)
@@ -585,68 +946,218 @@ async def encrypt(interaction: discord.Interaction, passphrase: str, text: str):
 @discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 async def decrypt(interaction: discord.Interaction, passphrase: str, encrypted_text: str):
     try:
-        key = base64.urlsafe_b64encode(hashlib.sha256(passphrase.encode()).digest())
-        f = Fernet(key)
-        decrypted_text = f.decrypt(encrypted_text.encode()).decode()
+        decrypted_text = await crypto_utils.decrypt(interaction.user.id, passphrase, encrypted_text)
         await interaction.response.send_message(f"Decrypted: ```{decrypted_text}```")
+    except crypto_utils.DecryptionError:
+        await interaction.response.send_message("Failed to decrypt: wrong passphrase or invalid encrypted text.", ephemeral=True)
     except Exception as e:
         await interaction.response.send_message(f"Failed to decrypt: {e}", ephemeral=True)
 
+SEARCH_PAGE_SIZE = 3
+
+def format_search_page(results, page):
+    start = page * SEARCH_PAGE_SIZE
+    response_message = "**Search Results:**\n"
+    for i, result in enumerate(results[start:start + SEARCH_PAGE_SIZE], start=start):
+        response_message += f"{i+1}. [{result['title']}]({result['href']})\n{result['body']}\n\n"
+    if len(results) > SEARCH_PAGE_SIZE:
+        response_message += f"Page {page + 1}/{(len(results) - 1) // SEARCH_PAGE_SIZE + 1}"
+    return chat_stream.split_message(response_message)[0]
+
+class SearchResultsView(discord.ui.View):
+    """Pages through an already-fetched result set without searching again."""
+
+    def __init__(self, results):
+        super().__init__(timeout=300)
+        self.results = results
+        self.page = 0
+        self.pages = (len(results) - 1) // SEARCH_PAGE_SIZE + 1
+        self.message = None
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.pages - 1
+
+    async def show_page(self, interaction: discord.Interaction, page: int):
+        self.page = page
+        self.update_buttons()
+        await interaction.response.edit_message(content=format_search_page(self.results, self.page), view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.gray)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, max(0, self.page - 1))
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.gray)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, min(self.pages - 1, self.page + 1))
+
+    async def on_timeout(self):
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
 @bot.tree.command(name="search", description="Searches on DuckDuckGo.")
 @discord.app_commands.allowed_installs(guilds=True, users=True)
 @discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 async def search(interaction: discord.Interaction, query: str):
-    await interaction.response.defer()
-    try:
-        results = DDGS().text(query=query, max_results=3)
-        if results:
-            response_message = "**Search Results:**\n"
-            for i, result in enumerate(results):
-                response_message += f"{i+1}. [{result['title']}]({result['href']})\n{result['body']}\n\n"
-            await interaction.followup.send(response_message)
-        else:
-            await interaction.followup.send("No results found.")
-    except Exception as e:
-        await interaction.followup.send(f"An error occurred during search: {e}", ephemeral=True)
+    results = search_service.get_cached(query)
+    if results is None:
+        await interaction.response.defer()
+        try:
+            results = await search_service.search(query)
+        except asyncio.TimeoutError:
+            await interaction.followup.send("The search took too long. Please try again.", ephemeral=True)
+            return
+        except Exception as e:
+            await interaction.followup.send(f"An error occurred during search: {e}", ephemeral=True)
+            return
+
+    send = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+    if not results:
+        await send("No results found.")
+        return
+    if len(results) <= SEARCH_PAGE_SIZE:
+        await send(format_search_page(results, 0))
+        return
+    view = SearchResultsView(results)
+    await send(format_search_page(results, 0), view=view)
+    view.message = await interaction.original_response()
 
 @bot.tree.command(name="chat", description="Interacts with the AI.")
 @discord.app_commands.allowed_installs(guilds=True, users=True)
 @discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 async def chat(interaction: discord.Interaction, message: str):
+    try:
+        ai_scheduler.check_rate(interaction.user.id, interaction.guild_id)
+    except scheduler.RateLimited as e:
+        await interaction.response.send_message(f"You're sending messages too fast. Try again in {e.retry_after:.0f}s.", ephemeral=True)
+        return
+
     await interaction.response.defer()
-    response = chat_with_together(message)
-    await interaction.followup.send(response)
+    history_key = (interaction.user.id, interaction.channel_id)
+    # Only context-free prompts are cacheable; follow-ups depend on the history.
+    system = _system_messages()
+    cache_key = None
+    if not conversations.has_history(history_key):
+        cache_key = chat_cache.make_key(message, CHAT_MODEL, CHAT_TEMPERATURE, system)
+    messages = conversations.build_messages(history_key, system, message)
+
+    queued = False
+    streamer = None
+
+    async def report_position(position):
+        nonlocal queued
+        queued = True
+        await interaction.edit_original_response(content=f"⏳ Waiting for the AI... you are #{position} in the queue.")
+
+    async def call_upstream():
+        nonlocal streamer
+        if not CHAT_STREAMING:
+            return await chat_with_together(messages)
+        streamer = chat_stream.MessageStreamer(interaction, edit_original=queued)
+        return await _stream_reply(streamer, messages)
+
+    async def fetch_reply():
+        return await ai_scheduler.run(interaction.user.id, call_upstream, on_position=report_position)
+
+    try:
+        if cache_key is None:
+            reply = await fetch_reply()
+        else:
+            reply = await chat_cache.get_or_fetch(cache_key, fetch_reply)
+    except scheduler.QueueFull:
+        await chat_stream.send_chunks(interaction, "The AI is busy right now. Please try again in a moment.", edit_original=queued)
+        return
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        if streamer is None or not streamer.has_output:
+            await chat_stream.send_chunks(interaction, _chat_error(e), edit_original=queued)
+        return
+
+    if reply:
+        conversations.record(history_key, message, reply)
+    if streamer is None or not streamer.has_output:
+        # Non-streamed, cached or coalesced reply
+        await chat_stream.send_chunks(interaction, reply or "An error occurred in AI response!", edit_original=queued)
+
+async def _stream_reply(streamer, messages):
+    """Streams the AI response through `streamer` and returns the full text."""
+    reply = ""
+    try:
+        async for delta in stream_chat_with_together(messages):
+            reply += delta
+            await streamer.feed(delta)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # Errors before any output are reported by the caller (or retried on 429).
+        if streamer.has_output:
+            await streamer.feed(f"\n{_chat_error(e)}")
+            await streamer.finish()
+        raise
+    await streamer.finish()
+    return reply
+
+@bot.tree.command(name="forget", description="Clears your /chat conversation memory in this channel.")
+@discord.app_commands.allowed_installs(guilds=True, users=True)
+@discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+async def forget(interaction: discord.Interaction):
+    conversations.clear((interaction.user.id, interaction.channel_id))
+    await interaction.response.send_message("Your conversation memory in this channel has been cleared.", ephemeral=True)
+
+class PurgeCancelView(discord.ui.View):
+    """Cancel button on the ephemeral /clear progress message."""
+
+    def __init__(self, job):
+        super().__init__(timeout=None)
+        self.job = job
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.red)
+    async def cancel_purge(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if interaction.user.id != self.job.requested_by:
+            await interaction.response.send_message("Only the user who started this clear can cancel it.", ephemeral=True)
+            return
+        self.job.cancel()
+        await interaction.response.defer()
 
 @bot.tree.command(name="clear", description="Clears messages in the channel.")
 @discord.app_commands.allowed_installs(guilds=True, users=True)
 @discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
 @discord.app_commands.checks.has_permissions(manage_messages=True)
-async def clear(interaction: discord.Interaction, amount: Optional[int] = None):
+@discord.app_commands.describe(
+    amount=f"How many matching messages to delete (default 100, max {purge.MAX_AMOUNT}).",
+    author="Only delete messages from this user.",
+    contains="Only delete messages containing this text.",
+    max_age_hours="Only delete messages newer than this many hours."
+)
+async def clear(interaction: discord.Interaction, amount: Optional[int] = None, author: Optional[discord.User] = None,
+                contains: Optional[str] = None, max_age_hours: Optional[float] = None):
     if amount is None:
-        limit = 100  # Default to 100 if not specified
-        await interaction.response.defer(ephemeral=True)
+        amount = 100  # Default to 100 if not specified
     elif amount <= 0:
         await interaction.response.send_message("Amount must be a positive number.", ephemeral=True)
         return
-    elif amount > 1000: # Limit to prevent accidental mass deletion
-        await interaction.response.send_message("Cannot clear more than 1000 messages at once.", ephemeral=True)
+    elif amount > purge.MAX_AMOUNT: # Limit to prevent accidental mass deletion
+        await interaction.response.send_message(f"Cannot clear more than {purge.MAX_AMOUNT} messages at once.", ephemeral=True)
+        return
+    if max_age_hours is not None and max_age_hours <= 0:
+        await interaction.response.send_message("max_age_hours must be a positive number.", ephemeral=True)
+        return
+    if purge.get_job(interaction.channel_id) is not None:
+        await interaction.response.send_message("A clear is already running in this channel.", ephemeral=True)
         return
-    else:
-        limit = amount + 1 # +1 to delete the command message itself
-        await interaction.response.defer(ephemeral=True)
 
-    try:
-        deleted = await interaction.channel.purge(limit=limit)
-        if amount is None:
-            await interaction.followup.send(f"Cleared {len(deleted) - 1} messages.", ephemeral=True)
-        else:
-            await interaction.followup.send(f"Cleared {len(deleted) - 1} messages.", ephemeral=True)
-    except discord.Forbidden:
-        await interaction.followup.send("I don't have permissions to delete messages.", ephemeral=True)
-    except discord.HTTPException as e:
-        await interaction.followup.send(f"An error occurred while clearing messages: {e}", ephemeral=True)
-    except Exception as e:
-        await interaction.followup.send(f"An unexpected error occurred: {e}", ephemeral=True)
+    # The purge runs in the background and reports back by editing this ephemeral response.
+    job = purge.PurgeJob(interaction.channel, amount, interaction.user.id, author=author, contains=contains, max_age_hours=max_age_hours)
+    view = PurgeCancelView(job)
+    await interaction.response.send_message(job.describe(), view=view, ephemeral=True)
+
+    async def report(job, final):
+        if final:
+            view.stop()
+        await interaction.edit_original_response(content=job.describe(final), view=None if final else view)
+
+    purge.start(job, report)
 
 @bot.tree.command(name="setprefix", description="Sets a custom prefix for this server.")
 @discord.app_commands.allowed_installs(guilds=True, users=True)
@@ -660,6 +1171,10 @@ async def setprefix(interaction: discord.Interaction, new_prefix: str):
         await interaction.response.send_message("Prefix cannot be longer than 10 characters.", ephemeral=True)
         return
     await database.set_prefix(interaction.guild_id, new_prefix)
+    if cluster.CLUSTER_ID is not None:
+        # Other clusters may have the old prefix cached; write it out before telling them.
+        await database.flush()
+        cluster.publish_invalidate(interaction.guild_id)
     await interaction.response.send_message(f"Prefix for this server has been set to `{new_prefix}`")
 
 @bot.tree.command(name="kick", description="Kicks a member from the server.")
@@ -696,8 +1211,65 @@ async def ban(interaction: discord.Interaction, member: discord.Member, reason:
     except discord.HTTPException as e:
         await interaction.followup.send(f"An error occurred while banning: {e}", ephemeral=True)
 
-# Run the bot
-if DISCORD_TOKEN:
-    bot.run(DISCORD_TOKEN)
-else:
-    print("DISCORD_TOKEN not found in .env file. Please set it.")
+async def run_moderation_job(interaction: discord.Interaction, action: str, targets: Optional[str],
+                             joined_within_minutes: Optional[int], reason: str, delete_message_seconds: int = 0):
+    if interaction.guild is None:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    if joined_within_minutes is not None and not bot.intents.members:
+        await interaction.response.send_message("The joined_within_minutes filter needs the Server Members intent (DISCORD_MEMBERS_INTENT=1).", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+
+    target_ids = moderation.parse_targets(targets)
+    if joined_within_minutes is not None:
+        target_ids += await moderation.members_joined_within(interaction.guild, joined_within_minutes)
+    job = moderation.ModerationJob(interaction.guild, action, target_ids, interaction.user, reason, delete_message_seconds)
+    if not job.target_ids:
+        await interaction.followup.send("No targets given. Mention users, paste their IDs, or use joined_within_minutes.", ephemeral=True)
+        return
+    if len(job.target_ids) > moderation.MAX_TARGETS:
+        await interaction.followup.send(f"Too many targets ({len(job.target_ids)}); the limit is {moderation.MAX_TARGETS}.", ephemeral=True)
+        return
+
+    async def report(job, final):
+        await interaction.edit_original_response(content=job.describe(final))
+
+    await job.run(report)
+
+@bot.tree.command(name="masskick", description="Kicks many members at once.")
+@discord.app_commands.allowed_installs(guilds=True, users=True)
+@discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+@discord.app_commands.checks.has_permissions(kick_members=True)
+@discord.app_commands.describe(
+    targets="Mentions and/or user IDs, separated by spaces.",
+    joined_within_minutes="Also kick everyone who joined in the last N minutes.",
+    reason="Reason shown in the audit log."
+)
+async def masskick(interaction: discord.Interaction, targets: Optional[str] = None,
+                   joined_within_minutes: Optional[discord.app_commands.Range[int, 1, 10080]] = None,
+                   reason: Optional[str] = "No reason provided."):
+    await run_moderation_job(interaction, "kick", targets, joined_within_minutes, reason)
+
+@bot.tree.command(name="massban", description="Bans many users at once.")
+@discord.app_commands.allowed_installs(guilds=True, users=True)
+@discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+@discord.app_commands.checks.has_permissions(ban_members=True)
+@discord.app_commands.describe(
+    targets="Mentions and/or user IDs, separated by spaces. Users who aren't members can be banned too.",
+    joined_within_minutes="Also ban everyone who joined in the last N minutes.",
+    delete_message_hours="Delete the users' messages from the last N hours (max 168).",
+    reason="Reason shown in the audit log."
+)
+async def massban(interaction: discord.Interaction, targets: Optional[str] = None,
+                  joined_within_minutes: Optional[discord.app_commands.Range[int, 1, 10080]] = None,
+                  delete_message_hours: discord.app_commands.Range[int, 0, 168] = 0,
+                  reason: Optional[str] = "No reason provided."):
+    await run_moderation_job(interaction, "ban", targets, joined_within_minutes, reason, delete_message_hours * 3600)
+
+# Run the bot (guarded so worker processes can import this module safely)
+if __name__ == "__main__":
+    if DISCORD_TOKEN:
+        bot.run(DISCORD_TOKEN)
+    else:
+        print("DISCORD_TOKEN not found in .env file. Please set it.")
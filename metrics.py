@@ -0,0 +1,244 @@
+import os
+import time
+import asyncio
+import functools
+from urllib.parse import urlsplit
+
+import discord
+from aiohttp import web
+
+# In-process metrics: counters, gauges and fixed-bucket histograms, rendered
+# in the Prometheus text format on a local HTTP endpoint and summarized by
+# /stats. Every bot.tree command callback is wrapped (duration, outcome and
+# error type), http_client reports every outbound request, and a background
+# task samples event-loop lag.
+HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+PORT = int(os.getenv("METRICS_PORT", "9108"))  # 0 disables the endpoint
+LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+_registry = []
+started_at = time.time()
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}  # label values -> count
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+class Gauge:
+    """A gauge whose value is read from `func` at scrape time."""
+
+    def __init__(self, name, help_text, func):
+        self.name = name
+        self.help_text = help_text
+        self.func = func
+        _registry.append(self)
+
+    def render(self):
+        value = self.func()
+        if value is None:
+            return
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {value}"
+
+class _Series:
+    def __init__(self, bucket_count):
+        self.counts = [0] * (bucket_count + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}  # label values -> _Series
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = _Series(len(self.buckets))
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        series.counts[index] += 1
+        series.sum += value
+        series.count += 1
+
+    def quantile(self, q, *label_values):
+        """Estimates a quantile by interpolating within the matching bucket."""
+        series = self.series.get(label_values)
+        if series is None or not series.count:
+            return None
+        rank = q * series.count
+        seen = 0
+        for index, count in enumerate(series.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower  # Open-ended +Inf bucket
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series.counts):
+                cumulative += count
+                labels = _format_labels(self.labels + ("le",), label_values + (bound,))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {series.sum}"
+            yield f"{self.name}_count{labels} {series.count}"
+
+command_duration = Histogram("pybot_command_duration_seconds", "Time spent in a slash command callback.", ("command",))
+command_delay = Histogram("pybot_command_delay_seconds", "Time from interaction creation to the callback starting.", ("command",))
+commands_total = Counter("pybot_commands_total", "Slash command invocations by outcome.", ("command", "outcome"))
+http_duration = Histogram("pybot_http_request_duration_seconds", "Outbound HTTP time until response headers, including retries.", ("host", "method"))
+http_requests = Counter("pybot_http_requests_total", "Outbound HTTP requests by final status or error type.", ("host", "method", "status"))
+loop_lag = Histogram("pybot_event_loop_lag_seconds", "How late the event loop ran a sleeping task.", buckets=LAG_BUCKETS)
+Gauge("pybot_uptime_seconds", "Seconds since the process started.", lambda: time.time() - started_at)
+
+def _find_interaction(args):
+    for arg in args:
+        if isinstance(arg, discord.Interaction):
+            return arg
+    return None
+
+def _instrument(command):
+    callback = command._callback
+    name = command.qualified_name
+
+    @functools.wraps(callback)
+    async def wrapped(*args, **kwargs):
+        started = time.perf_counter()
+        interaction = _find_interaction(args)
+        if interaction is not None:
+            command_delay.observe(max(0.0, time.time() - discord.utils.snowflake_time(interaction.id).timestamp()), name)
+        outcome = "ok"
+        try:
+            return await callback(*args, **kwargs)
+        except Exception as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            command_duration.observe(time.perf_counter() - started, name)
+            commands_total.inc(name, outcome)
+
+    wrapped._instrumented = True
+    command._callback = wrapped
+
+def instrument_tree(tree):
+    """Wraps the callback of every registered slash command. Call once, after all commands are defined."""
+    for command in tree.walk_commands():
+        if isinstance(command, discord.app_commands.Command) and not getattr(command._callback, "_instrumented", False):
+            _instrument(command)
+
+def observe_http(method, url, status, seconds):
+    """Called by http_client; `status` is the final status code or the error type name."""
+    host = urlsplit(str(url)).hostname or "unknown"
+    http_duration.observe(seconds, host, method)
+    http_requests.inc(host, method, status)
+
+async def _sample_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        loop_lag.observe(max(0.0, loop.time() - expected))
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+async def _handle_metrics(request):
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+class MetricsServer:
+    def __init__(self, port=PORT, host=HOST):
+        self.host = host
+        self.port = port
+        self._runner = None
+        self._lag_task = None
+
+    async def start(self):
+        self._lag_task = asyncio.create_task(_sample_loop_lag())
+        if not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", _handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError as e:
+            print(f"Failed to start metrics endpoint on {self.host}:{self.port}: {e}")
+            await self._runner.cleanup()
+            self._runner = None
+            return
+        print(f"Metrics available at http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+def summary(top=10):
+    """Short human-readable summary for /stats."""
+    lines = [f"Uptime: {(time.time() - started_at) / 3600:.1f}h"]
+    lines.append(f"Event loop lag: p50 {_ms(loop_lag.quantile(0.5))}, p99 {_ms(loop_lag.quantile(0.99))}")
+
+    totals = {}
+    errors = {}
+    for (name, outcome), count in commands_total.values.items():
+        totals[name] = totals.get(name, 0) + count
+        if outcome != "ok":
+            errors[name] = errors.get(name, 0) + count
+    if totals:
+        lines.append("Commands (calls, errors, p50, p95):")
+        for name in sorted(totals, key=totals.get, reverse=True)[:top]:
+            lines.append(f"  /{name}: {totals[name]}, {errors.get(name, 0)}, "
+                         f"{_ms(command_duration.quantile(0.5, name))}, {_ms(command_duration.quantile(0.95, name))}")
+
+    if http_duration.series:
+        lines.append("Upstream HTTP (calls, p50, p95):")
+        for (host, method), series in sorted(http_duration.series.items(), key=lambda item: -item[1].count)[:top]:
+            lines.append(f"  {method} {host}: {series.count}, "
+                         f"{_ms(http_duration.quantile(0.5, host, method))}, {_ms(http_duration.quantile(0.95, host, method))}")
+    return lines
@@ -0,0 +1,107 @@
+import os
+import json
+import base64
+import asyncio
+
+import aiohttp
+
+import http_client
+
+# System-prompt instructions for /chat. The decoded file is cached on disk so a
+# cold start needs no network; the remote copy is revalidated in the background
+# with ETag/Last-Modified and can be hot-reloaded without a restart.
+MODEL_FILE = "https://raw.githubusercontent.com/Hamzah82/pybot/main/Model_Encrypt.json"
+CACHE_DIR = os.getenv("PYBOT_CACHE_DIR", ".cache")
+CACHE_FILE = os.path.join(CACHE_DIR, "model_instructions.json")
+REFRESH_INTERVAL = float(os.getenv("MODEL_REFRESH_INTERVAL", "3600"))
+
+_instructions = None
+_etag = None
+_last_modified = None
+
+def get_instructions():
+    """Returns the current instructions, reading the disk cache on first use."""
+    global _instructions
+    if _instructions is None:
+        _instructions = _load_cache()
+    return _instructions
+
+def _load_cache():
+    global _etag, _last_modified
+    try:
+        with open(CACHE_FILE, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ Model cache unreadable: {e}")
+        return []
+    if data.get("url") != MODEL_FILE or not isinstance(data.get("instructions"), list):
+        return []
+    _etag = data.get("etag")
+    _last_modified = data.get("last_modified")
+    return data["instructions"]
+
+def _save_cache(instructions, etag, last_modified):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{CACHE_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"url": MODEL_FILE, "etag": etag, "last_modified": last_modified, "instructions": instructions}, f)
+    os.replace(tmp_path, CACHE_FILE)
+
+def _decode(encoded_data):
+    decoded_json = base64.b64decode(encoded_data).decode("utf-8")
+    instructions = json.loads(decoded_json)
+    if not isinstance(instructions, list):
+        raise ValueError("model file is not a list of messages")
+    return instructions
+
+async def refresh(force=False):
+    """Revalidates the model file against the remote copy.
+
+    Returns True if new instructions were loaded. On any failure the
+    current instructions are kept.
+    """
+    global _instructions, _etag, _last_modified
+    get_instructions()
+    headers = {}
+    if not force and _instructions:
+        if _etag:
+            headers["If-None-Match"] = _etag
+        if _last_modified:
+            headers["If-Modified-Since"] = _last_modified
+
+    try:
+        response = await http_client.request("GET", MODEL_FILE, headers=headers)
+        async with response:
+            if response.status == 304:
+                return False
+            encoded_data = await response.text()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"❌ Failed to fetch model: {e}")
+        return False
+
+    try:
+        instructions = _decode(encoded_data)
+    except Exception:
+        print("❌ Model corrupted or unreadable!")
+        return False
+
+    _instructions, _etag, _last_modified = instructions, etag, last_modified
+    try:
+        await asyncio.to_thread(_save_cache, instructions, etag, last_modified)
+    except OSError as e:
+        print(f"❌ Failed to write model cache: {e}")
+    return True
+
+async def run_refresh_loop(bot, interval=REFRESH_INTERVAL):
+    """Revalidates once the bot is ready, then every `interval` seconds (0 disables repeats)."""
+    await bot.wait_until_ready()
+    while True:
+        if await refresh():
+            print(f"Loaded model instructions ({len(_instructions)} message(s))")
+        if interval <= 0:
+            return
+        await asyncio.sleep(interval)
@@ -0,0 +1,206 @@
+import os
+import re
+import time
+import asyncio
+import datetime
+import sqlite3
+
+import discord
+
+import database
+
+# Batched kick/ban jobs for raid cleanup. Targets come from mentions, raw IDs
+# or a "joined in the last N minutes" filter; they are de-duplicated and
+# checked against the role hierarchy before anything is sent. Bans go through
+# the bulk ban endpoint (200 users per request) when the bot may use it; kicks
+# and fallback bans run concurrently under a small semaphore while discord.py
+# paces each route's rate-limit bucket. Every outcome lands in the
+# moderation_log table.
+MAX_TARGETS = int(os.getenv("MODERATION_MAX_TARGETS", "1000"))
+CONCURRENCY = int(os.getenv("MODERATION_CONCURRENCY", "5"))
+BULK_BAN_SIZE = 200
+PROGRESS_INTERVAL = float(os.getenv("MODERATION_PROGRESS_INTERVAL", "2"))
+
+_ID_RE = re.compile(r"<@!?(\d{15,21})>|\b(\d{15,21})\b")
+_active = set()  # (guild id, user id) with an action in flight
+
+def parse_targets(text):
+    """Returns the user IDs mentioned or listed in `text`, de-duplicated, in order."""
+    ids = {}
+    for mention, raw in _ID_RE.findall(text or ""):
+        ids[int(mention or raw)] = None
+    return list(ids)
+
+async def members_joined_within(guild, minutes):
+    """IDs of members who joined in the last `minutes`. Needs the Server Members intent."""
+    if not guild.chunked:
+        await guild.chunk()
+    cutoff = discord.utils.utcnow() - datetime.timedelta(minutes=minutes)
+    return [member.id for member in guild.members if member.joined_at is not None and member.joined_at >= cutoff]
+
+class ModerationJob:
+    def __init__(self, guild, action, target_ids, moderator, reason, delete_message_seconds=0):
+        self.guild = guild
+        self.action = action  # "kick" or "ban"
+        self.target_ids = list(dict.fromkeys(target_ids))
+        self.moderator = moderator
+        self.reason = reason
+        self.delete_message_seconds = delete_message_seconds
+        self.done = 0
+        self.skipped = {}  # user id -> why
+        self.failed = {}   # user id -> error
+        self._log = []
+        self._semaphore = asyncio.Semaphore(CONCURRENCY)
+        self._on_progress = None
+        self._last_report = 0.0
+
+    @property
+    def audit_reason(self):
+        return f"{self.reason} (by {self.moderator} via Pybot)"
+
+    def describe(self, final=False):
+        verb = "Kicked" if self.action == "kick" else "Banned"
+        text = f"{verb} {self.done}/{len(self.target_ids)}"
+        if self.skipped:
+            text += f", skipped {len(self.skipped)}"
+        if self.failed:
+            text += f", failed {len(self.failed)}"
+        if not final:
+            return f"Working... {text}"
+        details = [f"<@{user_id}>: {why}" for user_id, why in list({**self.skipped, **self.failed}.items())[:10]]
+        return "\n".join([f"Done. {text}."] + details)
+
+    def _record(self, user_id, outcome):
+        self._log.append((time.time(), self.guild.id, self.moderator.id, user_id, self.action, outcome, self.reason))
+
+    def _skip(self, user_id, why):
+        self.skipped[user_id] = why
+        self._record(user_id, f"skipped: {why}")
+
+    def _fail(self, user_id, error):
+        self.failed[user_id] = error
+        self._record(user_id, f"failed: {error}")
+
+    def _succeed(self, user_id):
+        self.done += 1
+        self._record(user_id, "ok")
+
+    async def _report(self, final=False):
+        now = time.monotonic()
+        if final or now - self._last_report >= PROGRESS_INTERVAL:
+            self._last_report = now
+            entries, self._log = self._log, []
+            try:
+                await database.log_moderation(entries)
+            except sqlite3.Error as e:
+                print(f"Failed to write {len(entries)} moderation log entries: {e}")
+            if self._on_progress is not None:
+                try:
+                    await self._on_progress(self, final)
+                except discord.HTTPException as e:
+                    print(f"Failed to report moderation progress: {e}")
+
+    def _check_identity(self, user_id):
+        if user_id == self.guild.owner_id:
+            return "server owner"
+        if user_id == self.moderator.id:
+            return "that's you"
+        if user_id == self.guild.me.id:
+            return "that's me"
+        return None
+
+    def _check_hierarchy(self, member):
+        """Returns why `member` must be skipped, or None."""
+        if self.moderator.id != self.guild.owner_id and member.top_role >= self.moderator.top_role:
+            return "role is not below yours"
+        if member.top_role >= self.guild.me.top_role:
+            return "role is not below mine"
+        return None
+
+    async def _prepare(self, user_id):
+        """Looks up and checks one target. Returns True if the action should go ahead."""
+        if (self.guild.id, user_id) in _active:
+            self._skip(user_id, "already being handled")
+            return False
+        why = self._check_identity(user_id)
+        if why is not None:
+            self._skip(user_id, why)
+            return False
+        member = self.guild.get_member(user_id)
+        if member is None:
+            try:
+                member = await self.guild.fetch_member(user_id)
+            except discord.NotFound:
+                if self.action == "kick":
+                    self._skip(user_id, "not in the server")
+                    return False
+                # Banning users who aren't members is allowed (pre-emptive ban).
+            except discord.HTTPException as e:
+                self._fail(user_id, str(e))
+                return False
+        why = self._check_hierarchy(member) if member is not None else None
+        if why is not None:
+            self._skip(user_id, why)
+            return False
+        _active.add((self.guild.id, user_id))
+        return True
+
+    async def _act(self, user_id):
+        async with self._semaphore:
+            if not await self._prepare(user_id):
+                return None
+            try:
+                if self.action == "kick":
+                    await self.guild.kick(discord.Object(user_id), reason=self.audit_reason)
+                else:
+                    await self.guild.ban(discord.Object(user_id), reason=self.audit_reason,
+                                         delete_message_seconds=self.delete_message_seconds)
+                self._succeed(user_id)
+            except discord.HTTPException as e:
+                self._fail(user_id, e.text or str(e))
+            finally:
+                _active.discard((self.guild.id, user_id))
+        await self._report()
+
+    async def _bulk_ban(self, user_ids):
+        """Bans `user_ids` with bulk requests. Returns the IDs that still need individual bans."""
+        for start in range(0, len(user_ids), BULK_BAN_SIZE):
+            chunk = user_ids[start:start + BULK_BAN_SIZE]
+            try:
+                result = await self.guild.bulk_ban([discord.Object(user_id) for user_id in chunk], reason=self.audit_reason,
+                                                   delete_message_seconds=self.delete_message_seconds)
+            except discord.HTTPException as e:
+                # Bulk bans also need Manage Server; fall back to one request per user.
+                print(f"Bulk ban failed, falling back to single bans: {e}")
+                return user_ids[start:]
+            for user in result.banned:
+                self._succeed(user.id)
+            for user in result.failed:
+                self._fail(user.id, "ban failed")
+            await self._report()
+        return []
+
+    async def _run_bans(self):
+        prepared = []
+        async def prepare(user_id):
+            async with self._semaphore:
+                if await self._prepare(user_id):
+                    prepared.append(user_id)
+        await asyncio.gather(*(prepare(user_id) for user_id in self.target_ids))
+        try:
+            remaining = await self._bulk_ban(prepared) if len(prepared) > 1 else prepared
+        finally:
+            for user_id in prepared:
+                _active.discard((self.guild.id, user_id))
+        await asyncio.gather(*(self._act(user_id) for user_id in remaining))
+
+    async def run(self, on_progress=None):
+        """Runs the job to completion, awaiting `on_progress(job, final)` along the way."""
+        self._on_progress = on_progress
+        try:
+            if self.action == "ban":
+                await self._run_bans()
+            else:
+                await asyncio.gather(*(self._act(user_id) for user_id in self.target_ids))
+        finally:
+            await self._report(final=True)
@@ -0,0 +1,277 @@
+import os
+import io
+import sys
+import time
+import marshal
+import pstats
+import asyncio
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+
+import watchdog
+
+# On-demand diagnostics for the running bot, behind owner-only commands:
+# cProfile or sampling profiles of the event loop thread for N seconds,
+# tracemalloc snapshots diffed against a baseline, and a dump of every asyncio
+# task with the chain of awaits it is suspended in. Each report is a short
+# summary plus files ({filename: bytes}) to attach to the reply.
+MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "600"))  # Interaction tokens expire after 15 minutes
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+TOP = 40
+
+_session = None   # The running profile, if any
+_baseline = None  # tracemalloc snapshot that diffs are taken against
+
+class ProfilingError(Exception):
+    pass
+
+def _where(filename, lineno=None):
+    name = os.path.basename(filename)
+    return name if lineno is None else f"{name}:{lineno}"
+
+# --- cProfile / sampling sessions ---
+
+class _Sampler:
+    """Samples the stack of one thread from a side thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()  # ((filename, function, line), ...) root first -> count
+        self._switch_interval = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="pybot-sampler", daemon=True)
+
+    def start(self):
+        # The sampler only runs when it gets the GIL, which the loop thread otherwise hands over
+        # mostly while waiting for I/O; a short switch interval keeps samples from skewing idle.
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval / 10))
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        await asyncio.to_thread(self._thread.join)
+        sys.setswitchinterval(self._switch_interval)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append((frame.f_code.co_filename, frame.f_code.co_name, frame.f_lineno))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+def _sampling_report(samples, elapsed, interval):
+    total = sum(samples.values())
+    if not total:
+        return "No samples were taken.", {}
+    leaf_counts = Counter()
+    inclusive = Counter()
+    folded = Counter()
+    idle = 0
+    for stack, count in samples.items():
+        filename, function, line = stack[-1]
+        leaf_counts[f"{_where(filename, line)} in {function}"] += count
+        # The loop waiting for I/O shows up as a select() call in selectors.py.
+        if os.path.basename(filename) == "selectors.py":
+            idle += count
+        functions = [f"{_where(filename)}:{function}" for filename, function, _ in stack]
+        for function in set(functions):
+            inclusive[function] += count
+        folded[";".join(functions)] += count
+
+    def table(counter):
+        return [f"{count / total * 100:6.2f}% {count:7d}  {name}" for name, count in counter.most_common(TOP)]
+
+    summary = (f"Sampled the event loop thread every {interval * 1000:g}ms for {elapsed:.1f}s: "
+               f"{total} samples, {idle / total * 100:.0f}% idle (waiting for I/O).")
+    top_leaf = leaf_counts.most_common(1)[0]
+    summary += f"\nHottest line: `{top_leaf[0]}` ({top_leaf[1] / total * 100:.1f}% of samples)."
+    text = "\n".join([summary, "", "Self (innermost frame):"] + table(leaf_counts)
+                     + ["", "Total (anywhere on the stack):"] + table(inclusive))
+    # One "frame;frame;frame count" line per stack, for flamegraph.pl or speedscope
+    folded_text = "\n".join(f"{stack} {count}" for stack, count in folded.most_common())
+    return summary, {"profile.txt": text.encode(), "profile.folded": folded_text.encode()}
+
+def _cprofile_report(profiler, elapsed):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stream.write(f"cProfile of the event loop thread for {elapsed:.1f}s\n\nBy cumulative time:\n")
+    stats.sort_stats("cumulative").print_stats(TOP)
+    stream.write("\nBy internal time:\n")
+    stats.sort_stats("tottime").print_stats(TOP)
+
+    hottest = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:3]
+    summary = f"Profiled the event loop thread with cProfile for {elapsed:.1f}s: {stats.total_calls} calls."
+    if hottest:
+        summary += "\nMost internal time: " + ", ".join(
+            f"`{_where(filename, line)} {function}` {timings[2]:.3f}s" for (filename, line, function), timings in hottest)
+    # profile.pstats loads with pstats.Stats("profile.pstats") or snakeviz.
+    return summary, {"profile.txt": stream.getvalue().encode(), "profile.pstats": marshal.dumps(stats.stats)}
+
+class ProfileSession:
+    def __init__(self, mode, seconds):
+        if mode not in ("sampling", "cprofile"):
+            raise ProfilingError(f"Unknown profiler mode {mode!r}.")
+        self.mode = mode
+        self.seconds = max(0.0, min(seconds, MAX_SECONDS))
+        self._stopped = asyncio.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    async def _wait(self):
+        try:
+            await asyncio.wait_for(self._stopped.wait(), self.seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        """Profiles the event loop thread until `seconds` pass or stop() is called. Returns (summary, files)."""
+        started = time.monotonic()
+        if self.mode == "cprofile":
+            # cProfile hooks only the thread it is enabled on: the event loop thread, here.
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await self._wait()
+            finally:
+                profiler.disable()
+            return await asyncio.to_thread(_cprofile_report, profiler, time.monotonic() - started)
+
+        sampler = _Sampler(threading.get_ident(), SAMPLE_INTERVAL)
+        sampler.start()
+        try:
+            await self._wait()
+        finally:
+            await sampler.stop()
+        return await asyncio.to_thread(_sampling_report, sampler.samples, time.monotonic() - started, SAMPLE_INTERVAL)
+
+async def profile(mode, seconds):
+    """Runs one profile session; only one can run at a time. Raises ProfilingError."""
+    global _session
+    if _session is not None:
+        raise ProfilingError(f"A {_session.mode} profile is already running.")
+    _session = ProfileSession(mode, seconds)
+    try:
+        return await _session.run()
+    finally:
+        _session = None
+
+def stop():
+    """Ends the running profile early. Returns False if none is running."""
+    if _session is None:
+        return False
+    _session.stop()
+    return True
+
+# --- tracemalloc ---
+
+def _take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+def _format_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GiB"
+
+async def memory_snapshot():
+    """Starts tracing if needed and stores a baseline for memory_diff(). Returns (summary, files)."""
+    global _baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        _baseline = await asyncio.to_thread(_take_snapshot)
+        return (f"Started tracemalloc ({TRACEMALLOC_FRAMES} frames) and took a baseline. "
+                "Only allocations made from now on are traced; run the diff later."), {}
+    _baseline = await asyncio.to_thread(_take_snapshot)
+    stats = _baseline.statistics("lineno")
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f"{_format_size(stat.size):>9} {stat.count:8d} blocks  {stat.traceback}" for stat in stats[:TOP]]
+    summary = f"New baseline taken. Traced memory: {_format_size(current)} (peak {_format_size(peak)})."
+    return summary, {"memory.txt": "\n".join([summary, "", "Largest allocation sites:"] + lines).encode()}
+
+def _diff_report(baseline, snapshot):
+    diff = snapshot.compare_to(baseline, "traceback")
+    growth = sum(stat.size_diff for stat in diff)
+    lines = []
+    for stat in diff[:TOP]:
+        lines.append(f"{_format_size(stat.size_diff):>9} ({stat.count_diff:+d} blocks), now {_format_size(stat.size)}")
+        lines.extend(f"    {line}" for line in stat.traceback.format(most_recent_first=True))
+    top = diff[0] if diff else None
+    summary = f"Traced memory changed by {_format_size(growth)} since the baseline."
+    if top is not None:
+        frame = top.traceback[-1]
+        summary += f"\nBiggest change: {_format_size(top.size_diff)} at `{_where(frame.filename, frame.lineno)}`."
+    return summary, {"memory_diff.txt": "\n".join([summary, ""] + lines).encode()}
+
+async def memory_diff():
+    """Compares a new snapshot against the baseline. Returns (summary, files)."""
+    if not tracemalloc.is_tracing() or _baseline is None:
+        raise ProfilingError("tracemalloc is not running; take a snapshot first.")
+    snapshot = await asyncio.to_thread(_take_snapshot)
+    return await asyncio.to_thread(_diff_report, _baseline, snapshot)
+
+def memory_stop():
+    """Stops tracing and frees the traces. Returns False if tracemalloc was not running."""
+    global _baseline
+    _baseline = None
+    if not tracemalloc.is_tracing():
+        return False
+    tracemalloc.stop()
+    return True
+
+# --- asyncio tasks ---
+
+def _describe_future(future):
+    if isinstance(future, asyncio.Task):
+        return f"task {future.get_name()}"
+    return f"{type(future).__name__} ({'done' if future.done() else 'pending'})"
+
+def await_chain(coro):
+    """Where a coroutine is suspended, outermost first, following what each frame awaits."""
+    chain = []
+    while coro is not None and len(chain) < 50:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is not None:
+            chain.append(f"{_where(frame.f_code.co_filename, frame.f_lineno)} in {frame.f_code.co_name}")
+        if isinstance(coro, asyncio.Future):
+            chain.append(f"waiting on {_describe_future(coro)}")
+            break
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return chain
+
+def dump_tasks():
+    """Lists every task on the running loop, grouping identical await chains. Returns (summary, files)."""
+    groups = {}  # (coroutine, chain) -> [task descriptions]
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        name = getattr(coro, "__qualname__", type(coro).__name__)
+        description = task.get_name()
+        tag = watchdog.task_tag(task)
+        if tag is not None:
+            description += f" [{tag}]"
+        groups.setdefault((name, tuple(await_chain(coro))), []).append(description)
+
+    ordered = sorted(groups.items(), key=lambda item: len(item[1]), reverse=True)
+    lines = []
+    for (name, chain), tasks in ordered:
+        names = ", ".join(tasks[:5]) + (f" and {len(tasks) - 5} more" if len(tasks) > 5 else "")
+        lines.append(f"{len(tasks)} x {name} ({names})")
+        lines.extend(f"    {step}" for step in chain)
+        lines.append("")
+    total = sum(len(tasks) for tasks in groups.values())
+    summary = f"{total} task(s) on the event loop. Most common:\n" + "\n".join(
+        f"{len(tasks)} x `{name}`" for (name, _), tasks in ordered[:10])
+    return summary, {"tasks.txt": "\n".join(lines).encode()}
@@ -0,0 +1,171 @@
+import os
+import time
+import asyncio
+import datetime
+
+import discord
+
+# Background message purge for /clear. Channel history is streamed page by
+# page; messages younger than 14 days are deleted in bulk (100 per request)
+# and older ones, which the bulk endpoint rejects, are deleted one by one on
+# a separate task so both rate-limit buckets are used at once. discord.py
+# waits out 429s itself, so each side simply runs as fast as it is allowed.
+BULK_SIZE = 100
+BULK_MAX_AGE = datetime.timedelta(days=14, minutes=-5)  # Small margin before Discord's cutoff
+MAX_AMOUNT = int(os.getenv("PURGE_MAX_AMOUNT", "10000"))
+SCAN_LIMIT = int(os.getenv("PURGE_SCAN_LIMIT", "50000"))  # Messages looked at per job, matching or not
+PROGRESS_INTERVAL = float(os.getenv("PURGE_PROGRESS_INTERVAL", "2"))
+PERMISSION_ERROR = "I don't have permissions to delete messages."
+
+_jobs = {}  # channel id -> running PurgeJob
+
+class PurgeJob:
+    def __init__(self, channel, amount, requested_by, author=None, contains=None, max_age_hours=None):
+        self.channel = channel
+        self.amount = amount
+        self.requested_by = requested_by
+        self.author = author
+        self.contains = contains.lower() if contains else None
+        self.max_age_hours = max_age_hours
+        # Bulk deletes only exist for guild channels
+        self.can_bulk = hasattr(channel, "delete_messages")
+        self.scanned = 0
+        self.deleted = 0
+        self.failed = 0
+        self.cancelled = False
+        self.error = None
+        self.task = None
+        self._on_progress = None
+        self._last_report = 0.0
+
+    def matches(self, message):
+        if self.author is not None and message.author.id != self.author.id:
+            return False
+        if self.contains is not None and self.contains not in message.content.lower():
+            return False
+        return True
+
+    def describe(self, final=False):
+        counts = f"{self.deleted} deleted, {self.scanned} scanned"
+        if self.failed:
+            counts += f", {self.failed} failed"
+        if not final:
+            return f"Clearing messages... ({counts})"
+        if self.error:
+            return f"{self.error} ({counts})"
+        if self.cancelled:
+            return f"Cancelled. ({counts})"
+        return f"Cleared {self.deleted} messages."
+
+    def cancel(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    async def _report(self, final=False):
+        now = time.monotonic()
+        if self._on_progress is None or (not final and now - self._last_report < PROGRESS_INTERVAL):
+            return
+        self._last_report = now
+        try:
+            await self._on_progress(self, final)
+        except discord.HTTPException as e:
+            # The interaction token expires after 15 minutes; the purge itself carries on.
+            print(f"Failed to report purge progress: {e}")
+
+    async def _run(self):
+        singles = asyncio.Queue(maxsize=BULK_SIZE)
+        single_deleter = asyncio.create_task(self._delete_singles(singles))
+        now = discord.utils.utcnow()
+        bulk_cutoff = discord.utils.time_snowflake(now - BULK_MAX_AGE)
+        age_cutoff = now - datetime.timedelta(hours=self.max_age_hours) if self.max_age_hours else None
+        batch = []
+        matched = 0
+        try:
+            async for message in self.channel.history(limit=SCAN_LIMIT):
+                self.scanned += 1
+                if age_cutoff is not None and message.created_at < age_cutoff:
+                    break  # History is newest first, so nothing further can match
+                if not self.matches(message):
+                    continue
+                matched += 1
+                if self.can_bulk and message.id > bulk_cutoff:
+                    batch.append(message)
+                    if len(batch) == BULK_SIZE:
+                        await self._delete_bulk(batch, singles)
+                        batch = []
+                else:
+                    await singles.put(message)
+                if matched >= self.amount or self.error:
+                    break
+                await self._report()
+            if batch:
+                await self._delete_bulk(batch, singles)
+            await singles.put(None)
+            await single_deleter
+        finally:
+            single_deleter.cancel()
+
+    async def _delete_bulk(self, batch, singles):
+        try:
+            if len(batch) == 1:
+                await batch[0].delete()
+            else:
+                await self.channel.delete_messages(batch)
+            self.deleted += len(batch)
+        except discord.Forbidden:
+            self.error = PERMISSION_ERROR
+            return
+        except discord.HTTPException as e:
+            # Typically a message that crossed the 14-day line meanwhile; retry them individually.
+            print(f"Bulk delete failed, falling back to single deletes: {e}")
+            for message in batch:
+                await singles.put(message)
+        await self._report()
+
+    async def _delete_singles(self, singles):
+        while True:
+            message = await singles.get()
+            if message is None:
+                return
+            if self.error:
+                continue  # Drain the queue so the producer never blocks
+            try:
+                await message.delete()
+                self.deleted += 1
+            except discord.NotFound:
+                pass
+            except discord.Forbidden:
+                self.error = PERMISSION_ERROR
+            except discord.HTTPException as e:
+                self.failed += 1
+                print(f"Failed to delete message {message.id}: {e}")
+            await self._report()
+
+    async def _main(self):
+        try:
+            await self._run()
+        except asyncio.CancelledError:
+            self.cancelled = True
+        except discord.Forbidden:
+            self.error = PERMISSION_ERROR
+        except discord.HTTPException as e:
+            self.error = f"An error occurred while clearing messages: {e}"
+        finally:
+            _jobs.pop(self.channel.id, None)
+        await self._report(final=True)
+
+def get_job(channel_id):
+    return _jobs.get(channel_id)
+
+def start(job, on_progress):
+    """Starts `job` in the background. `on_progress(job, final)` is awaited with progress updates."""
+    job._on_progress = on_progress
+    _jobs[job.channel.id] = job
+    job.task = asyncio.create_task(job._main())
+    return job
+
+async def cancel_all():
+    tasks = [job.task for job in _jobs.values() if job.task is not None]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
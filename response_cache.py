@@ -0,0 +1,112 @@
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+
+from caching import TTLCache, InflightRequests
+
+# Cache for first-turn /chat prompts. Memory tier is always on; set
+# CHAT_CACHE_DB to a file path to add a persistent SQLite tier.
+MEMORY_ENTRIES = int(os.getenv("CHAT_CACHE_ENTRIES", "512"))
+MEMORY_TTL = float(os.getenv("CHAT_CACHE_TTL", "3600"))
+DB_PATH = os.getenv("CHAT_CACHE_DB")
+DB_TTL = float(os.getenv("CHAT_CACHE_DB_TTL", "86400"))
+
+def normalize_prompt(prompt):
+    prompt = " ".join(prompt.lower().split())
+    return re.sub(r"[\s?!.]+$", "", prompt)
+
+class ResponseCache:
+    def __init__(self, max_entries=MEMORY_ENTRIES, ttl=MEMORY_TTL, db_path=DB_PATH, db_ttl=DB_TTL):
+        self.memory = TTLCache(max_entries, ttl)
+        self.inflight = InflightRequests()
+        self.db_path = db_path
+        self.db_ttl = db_ttl
+        self._db = None
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(prompt, model, temperature, system=()):
+        # The system messages are part of the key so changed instructions never get old answers.
+        instructions = json.dumps(system, sort_keys=True, ensure_ascii=False)
+        raw = f"{model}\x00{temperature}\x00{instructions}\x00{normalize_prompt(prompt)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "entries": len(self.memory),
+            "inflight": len(self.inflight)
+        }
+
+    async def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self.db_path:
+            value = await asyncio.to_thread(self._db_get, key)
+            if value is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                self.memory.set(key, value)
+                return value
+        return None
+
+    async def set(self, key, value):
+        self.memory.set(key, value)
+        if self.db_path:
+            await asyncio.to_thread(self._db_set, key, value)
+
+    async def get_or_fetch(self, key, fetch):
+        """Returns the cached value for `key`, or awaits `fetch()` once for all concurrent callers."""
+        value = await self.get(key)
+        if value is not None:
+            return value
+        if self.inflight.get(key) is None:
+            self.misses += 1
+        value, coalesced = await self.inflight.run(key, fetch)
+        if coalesced:
+            self.coalesced += 1
+        elif value:
+            await self.set(key, value)
+        return value
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS chat_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)")
+            self._db.execute("DELETE FROM chat_cache WHERE created_at < ?", (time.time() - self.db_ttl,))
+            self._db.commit()
+        return self._db
+
+    def _db_get(self, key):
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT value FROM chat_cache WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.db_ttl)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _db_set(self, key, value):
+        with self._db_lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO chat_cache (key, value, created_at) VALUES (?, ?, ?)", (key, value, time.time()))
+            db.commit()
@@ -0,0 +1,227 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+
+import aiohttp
+
+from caching import TTLCache
+
+# Scheduler for outbound AI calls: per-user/per-guild token buckets, a global
+# concurrency limit that adapts to upstream 429s, and a bounded queue that is
+# drained round-robin by user so one spammer cannot starve everyone else.
+MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+MAX_QUEUE = int(os.getenv("AI_MAX_QUEUE", "50"))
+USER_RATE = float(os.getenv("AI_USER_RATE", "0.2"))      # requests per second
+USER_BURST = float(os.getenv("AI_USER_BURST", "3"))
+GUILD_RATE = float(os.getenv("AI_GUILD_RATE", "1"))
+GUILD_BURST = float(os.getenv("AI_GUILD_BURST", "10"))
+MAX_RATE_LIMIT_RETRIES = int(os.getenv("AI_MAX_429_RETRIES", "2"))
+DEFAULT_RETRY_AFTER = 2.0
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limited, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class QueueFull(Exception):
+    pass
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+class AIScheduler:
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, max_queue=MAX_QUEUE,
+                 user_rate=USER_RATE, user_burst=USER_BURST,
+                 guild_rate=GUILD_RATE, guild_burst=GUILD_BURST,
+                 max_retries=MAX_RATE_LIMIT_RETRIES):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.user_rate, self.user_burst = user_rate, user_burst
+        self.guild_rate, self.guild_burst = guild_rate, guild_burst
+        # Entries expire burst/rate seconds after their last use; a bucket idle
+        # that long has refilled completely, so it can simply be recreated.
+        self._user_buckets = TTLCache(10000, user_burst / user_rate)
+        self._guild_buckets = TTLCache(10000, guild_burst / guild_rate)
+        self._waiting = OrderedDict()  # user_id -> deque of waiters, in round-robin order
+        self._queued = 0
+        self.active = 0
+        self._paused_until = 0.0
+        self._resume_handle = None
+        self._successes = 0
+        self.rate_limited = 0
+        self.throttled = 0
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "limit": self.limit,
+            "queued": self._queued,
+            "rejected": self.rate_limited,
+            "upstream_429": self.throttled
+        }
+
+    def _bucket(self, cache, key, rate, burst):
+        bucket = cache.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, burst)
+        cache.set(key, bucket)  # Restart the expiry on every use
+        return bucket
+
+    def check_rate(self, user_id, guild_id=None):
+        """Consumes a token for the user (and guild) or raises RateLimited."""
+        buckets = [self._bucket(self._user_buckets, user_id, self.user_rate, self.user_burst)]
+        if guild_id is not None:
+            buckets.append(self._bucket(self._guild_buckets, guild_id, self.guild_rate, self.guild_burst))
+        wait = max(bucket.wait_time() for bucket in buckets)
+        if wait > 0:
+            self.rate_limited += 1
+            raise RateLimited(wait)
+        for bucket in buckets:
+            bucket.take()
+
+    async def run(self, user_id, call, on_position=None):
+        """Runs `call()` once a concurrency slot is free, retrying upstream 429s after their Retry-After."""
+        attempt = 0
+        while True:
+            await self._acquire(user_id, on_position)
+            try:
+                result = await call()
+            except aiohttp.ClientResponseError as e:
+                if e.status != 429 or attempt >= self.max_retries:
+                    raise
+                self._throttle(e.headers, attempt)
+                attempt += 1
+            else:
+                self._on_success()
+                return result
+            finally:
+                self._release()
+
+    def _can_start(self):
+        return self.active < self.limit and time.monotonic() >= self._paused_until
+
+    async def _acquire(self, user_id, on_position):
+        if not self._waiting and self._can_start():
+            self.active += 1
+            return
+        if self._queued >= self.max_queue:
+            raise QueueFull("The AI request queue is full.")
+
+        # [granted future, on_position, last reported position, last report task]
+        waiter = [asyncio.get_running_loop().create_future(), on_position, None, None]
+        self._waiting.setdefault(user_id, deque()).append(waiter)
+        self._queued += 1
+        self._dispatch()
+        try:
+            await waiter[0]
+            if waiter[3] is not None:
+                # A report landing after the job starts would overwrite its output.
+                await waiter[3]
+        except asyncio.CancelledError:
+            if waiter[3] is not None:
+                waiter[3].cancel()
+            if waiter[0].done() and not waiter[0].cancelled():
+                # The slot was granted just as we were cancelled; hand it back.
+                self._release()
+            else:
+                self._discard(user_id, waiter)
+            raise
+
+    def _discard(self, user_id, waiter):
+        queue = self._waiting.get(user_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._queued -= 1
+            if not queue:
+                del self._waiting[user_id]
+            self._notify_positions()
+
+    def _release(self):
+        self.active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._waiting and self._can_start():
+            user_id, queue = next(iter(self._waiting.items()))
+            waiter = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._waiting.move_to_end(user_id)
+            else:
+                del self._waiting[user_id]
+            if waiter[0].done():
+                continue
+            self.active += 1
+            waiter[0].set_result(None)
+
+        if self._waiting and self._resume_handle is None and time.monotonic() < self._paused_until:
+            loop = asyncio.get_running_loop()
+            self._resume_handle = loop.call_later(self._paused_until - time.monotonic(), self._resume)
+        self._notify_positions()
+
+    def _resume(self):
+        self._resume_handle = None
+        self._dispatch()
+
+    def _notify_positions(self):
+        lengths = [len(queue) for queue in self._waiting.values()]
+        for j, queue in enumerate(self._waiting.values()):
+            for i, waiter in enumerate(queue):
+                if waiter[1] is None:
+                    continue
+                # Round-robin: users ahead in the rotation get i + 1 turns before us, the rest get i.
+                ahead = i + sum(min(length, i + 1) for length in lengths[:j]) + sum(min(length, i) for length in lengths[j + 1:])
+                position = ahead + 1
+                if position != waiter[2]:
+                    waiter[2] = position
+                    waiter[3] = asyncio.ensure_future(_report(waiter[1], position, waiter[3]))
+
+    def _throttle(self, headers, attempt):
+        self.throttled += 1
+        retry_after = None
+        if headers is not None:
+            try:
+                retry_after = float(headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                retry_after = None
+        if retry_after is None:
+            retry_after = DEFAULT_RETRY_AFTER * (2 ** attempt)
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        # Multiplicative decrease on 429, additive increase on sustained success.
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+
+    def _on_success(self):
+        self._successes += 1
+        if self.limit < self.max_concurrency and self._successes >= self.limit:
+            self.limit += 1
+            self._successes = 0
+
+async def _report(callback, position, previous):
+    # Reports for one waiter run in order, so the newest position is the one left shown.
+    if previous is not None:
+        await asyncio.wait({previous})
+    try:
+        await callback(position)
+    except Exception as e:
+        print(f"Failed to report queue position: {e}")
@@ -0,0 +1,58 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from caching import TTLCache, InflightRequests
+
+# DuckDuckGo search off the event loop: a bounded thread pool where each
+# thread reuses its own DDGS client, a per-query timeout, a TTL/LRU result
+# cache and coalescing of identical concurrent queries.
+WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))
+TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "10"))
+MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "9"))
+CACHE_ENTRIES = int(os.getenv("SEARCH_CACHE_ENTRIES", "256"))
+CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="pybot-search")
+_local = threading.local()
+_cache = TTLCache(CACHE_ENTRIES, CACHE_TTL)
+_inflight = InflightRequests()
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+def _client():
+    client = getattr(_local, "client", None)
+    if client is None:
+        from ddgs import DDGS  # Imported on first search to keep startup fast
+        client = _local.client = DDGS()
+    return client
+
+def _search_blocking(query, max_results):
+    return list(_client().text(query=query, max_results=max_results) or [])
+
+def get_cached(query):
+    return _cache.get(normalize_query(query))
+
+async def search(query):
+    """Returns up to MAX_RESULTS results for `query`, served from cache when possible.
+
+    Raises asyncio.TimeoutError if the search takes longer than TIMEOUT.
+    """
+    key = normalize_query(query)
+    results = _cache.get(key)
+    if results is not None:
+        return results
+
+    async def fetch():
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_executor, _search_blocking, query, MAX_RESULTS)
+        return await asyncio.wait_for(future, TIMEOUT)
+
+    results, _ = await _inflight.run(key, fetch)
+    _cache.set(key, results)
+    return results
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,72 @@
+# Bitboard Tic-Tac-Toe engine. A position is two 9-bit integers (one per
+# player, bit i = cell i). Every reachable position is solved once by
+# precompute(), called from the bot's setup_hook rather than at import, so
+# hard-mode moves are a dictionary lookup.
+
+FULL_BOARD = 0b111111111
+
+WIN_MASKS = tuple(
+    sum(1 << cell for cell in combo)
+    for combo in (
+        (0, 1, 2), (3, 4, 5), (6, 7, 8),  # Rows
+        (0, 3, 6), (1, 4, 7), (2, 5, 8),  # Columns
+        (0, 4, 8), (2, 4, 6)              # Diagonals
+    )
+)
+
+def is_win(bits):
+    for mask in WIN_MASKS:
+        if bits & mask == mask:
+            return True
+    return False
+
+def to_bits(board, symbol):
+    """Converts a list board of "X"/"O"/" " cells to the bitboard for `symbol`."""
+    bits = 0
+    for index, cell in enumerate(board):
+        if cell == symbol:
+            bits |= 1 << index
+    return bits
+
+def empty_cells(x_bits, o_bits):
+    occupied = x_bits | o_bits
+    return [i for i in range(9) if not occupied >> i & 1]
+
+# (x_bits, o_bits) -> (score, best_move) for the side to move. Scores prefer
+# faster wins and slower losses; ties go to the lowest cell index.
+_table = {}
+
+def _solve(mover, opponent):
+    key = (mover, opponent)
+    entry = _table.get(key)
+    if entry is not None:
+        return entry[0]
+    occupied = mover | opponent
+    empties = 9 - bin(occupied).count("1")
+    if is_win(opponent):
+        entry = (-(empties + 1), None)
+    elif occupied == FULL_BOARD:
+        entry = (0, None)
+    else:
+        best_score, best_move = None, None
+        for cell in range(9):
+            bit = 1 << cell
+            if occupied & bit:
+                continue
+            score = -_solve(opponent, mover | bit)
+            if best_score is None or score > best_score:
+                best_score, best_move = score, cell
+        entry = (best_score, best_move)
+    _table[key] = entry
+    return entry[0]
+
+def best_move(mover_bits, opponent_bits):
+    """Returns the perfect-play move for the side owning `mover_bits`, or None if the game is over."""
+    key = (mover_bits, opponent_bits)
+    if key not in _table:
+        _solve(mover_bits, opponent_bits)
+    return _table[key][1]
+
+def precompute():
+    """Solves every position reachable from the empty board (X moves first)."""
+    _solve(0, 0)
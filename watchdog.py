@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+import asyncio
+import functools
+import threading
+import traceback
+
+import discord
+
+# Event-loop blocking detector. A side thread posts a heartbeat callback to
+# the loop every INTERVAL seconds; when the loop has not run it for longer
+# than THRESHOLD, the thread grabs the loop thread's current stack, tags it
+# with the slash command whose task was running, and logs it. Stalls are
+# aggregated per (command, code location) into a rolling table of offenders.
+ENABLED = os.getenv("WATCHDOG", "1") != "0"
+THRESHOLD = float(os.getenv("WATCHDOG_THRESHOLD", "0.25"))
+INTERVAL = float(os.getenv("WATCHDOG_INTERVAL", "0.05"))
+STACK_DEPTH = 25
+MAX_OFFENDERS = 100
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Command wrappers show up in every stack; they are never the culprit.
+_WRAPPER_FILES = {os.path.join(_PROJECT_DIR, name) for name in ("watchdog.py", "metrics.py")}
+_running = {}  # task -> "/command (interaction ..., user ...)"
+
+def instrument_tree(tree):
+    """Tags the tasks running slash command callbacks so stalls can be attributed to them."""
+    for command in tree.walk_commands():
+        if isinstance(command, discord.app_commands.Command) and not getattr(command._callback, "_watchdog", False):
+            _instrument(command)
+
+def _instrument(command):
+    callback = command._callback
+    name = command.qualified_name
+
+    @functools.wraps(callback)
+    async def wrapped(*args, **kwargs):
+        interaction = next((arg for arg in args if isinstance(arg, discord.Interaction)), None)
+        task = asyncio.current_task()
+        tag = f"/{name}"
+        if interaction is not None:
+            tag += f" (interaction {interaction.id}, user {interaction.user.id})"
+        _running[task] = tag
+        try:
+            return await callback(*args, **kwargs)
+        finally:
+            _running.pop(task, None)
+
+    wrapped._watchdog = True
+    command._callback = wrapped
+
+def task_tag(task):
+    """The command a task is running, as tagged by instrument_tree(), or None."""
+    return _running.get(task)
+
+class Offender:
+    def __init__(self, command, location):
+        self.command = command
+        self.location = location
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last_seen = 0.0
+        self.last_tag = None
+        self.last_stack = None
+
+def _location(frames):
+    """The innermost frame in our own code, else the innermost frame."""
+    for frame in reversed(frames):
+        if frame.filename.startswith(_PROJECT_DIR) and frame.filename not in _WRAPPER_FILES:
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}"
+    if frames:
+        frame = frames[-1]
+        return f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+class Watchdog:
+    def __init__(self, threshold=THRESHOLD, interval=INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.offenders = {}  # (command, location) -> Offender
+        self._lock = threading.Lock()  # offenders is changed on the watchdog thread, read on the loop
+        self.stalls = 0
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_beat = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts monitoring the running event loop. Must be called from the loop thread."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._monitor, name="pybot-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _beat(self):
+        self._last_beat = time.monotonic()
+
+    def _monitor(self):
+        stall = None  # Offender being blocked right now
+        stall_blocked = 0.0
+        while not self._stop.wait(self.interval):
+            try:
+                self._loop.call_soon_threadsafe(self._beat)
+            except RuntimeError:
+                return  # Loop closed
+            # A beat posted last round should have run about `interval` ago.
+            blocked = time.monotonic() - self._last_beat - self.interval
+            if blocked >= self.threshold:
+                if stall is None:
+                    stall = self._capture(blocked)
+                stall_blocked = blocked
+            elif stall is not None:
+                self._finish(stall, stall_blocked)
+                stall = None
+
+    def _capture(self, blocked):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        frames = traceback.extract_stack(frame, limit=STACK_DEPTH) if frame is not None else []
+        task = asyncio.current_task(self._loop)
+        tag = task_tag(task)
+        if tag is None:
+            tag = task.get_name() if task is not None else "no task (loop callback)"
+        command = tag.split(" (", 1)[0]
+        location = _location(frames)
+
+        key = (command, location)
+        stack = "".join(traceback.format_list(frames))
+        with self._lock:
+            offender = self.offenders.get(key)
+            if offender is None:
+                if len(self.offenders) >= MAX_OFFENDERS:
+                    # Make room by forgetting the least costly offender.
+                    del self.offenders[min(self.offenders, key=lambda k: self.offenders[k].total)]
+                offender = self.offenders[key] = Offender(command, location)
+            offender.last_tag = tag
+            offender.last_stack = stack
+            offender.last_seen = time.time()
+            self.stalls += 1
+        print(f"Event loop blocked for over {blocked:.2f}s by {tag} at {location}:\n{offender.last_stack}")
+        return offender
+
+    def _finish(self, offender, blocked):
+        with self._lock:
+            offender.count += 1
+            offender.total += blocked
+            offender.max = max(offender.max, blocked)
+
+    def top(self, n=10):
+        """Offenders sorted by total blocked time, worst first."""
+        with self._lock:
+            offenders = list(self.offenders.values())
+        return sorted(offenders, key=lambda o: o.total, reverse=True)[:n]
@@ -0,0 +1,80 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Named process pools for CPU-bound work (game search, /calc, /roll, ...) so it never runs
+# on the event loop thread. Pools are created on first use.
+POOL_SIZES = {
+    "games": int(os.getenv("GAME_WORKERS", "1")),
+    "calc": int(os.getenv("CALC_WORKERS", "1")),
+    "dice": int(os.getenv("DICE_WORKERS", "1")),
+}
+
+# Never fork the bot itself: its other threads (aiohttp resolver, SQLite writer,
+# watchdog, ...) may hold locks that the child would inherit forever locked. Workers
+# are forked from a single-threaded fork server instead, which imports the bot once
+# rather than once per worker as spawn would, so restarting a killed pool stays cheap.
+_context = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+_pools = {}
+
+def start():
+    """Starts the fork server ahead of the first job. Blocks while it imports the bot."""
+    if _context.get_start_method() == "forkserver":
+        from multiprocessing import forkserver
+        forkserver.ensure_running()
+
+def get_pool(name):
+    pool = _pools.get(name)
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=POOL_SIZES.get(name, 1), mp_context=_context)
+        _pools[name] = pool
+    return pool
+
+async def run(name, func, *args, timeout=None):
+    """Runs func(*args) in the named process pool.
+
+    If `timeout` expires the pool's workers are killed (a stuck worker cannot
+    be interrupted otherwise) and asyncio.TimeoutError is raised; the pool is
+    recreated on the next call. Calls that were still pending in a killed or
+    crashed pool raise BrokenProcessPool.
+    """
+    future = asyncio.get_running_loop().run_in_executor(get_pool(name), func, *args)
+    if timeout is None:
+        return await _wait(future)
+    try:
+        return await asyncio.wait_for(_wait(future), timeout)
+    except asyncio.TimeoutError:
+        _kill(name)
+        raise
+
+async def _wait(future):
+    # Unlike `await future`, a future cancelled by _kill() must not look like
+    # this task being cancelled.
+    try:
+        await asyncio.wait({future})
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    if future.cancelled():
+        raise BrokenProcessPool("The worker pool was restarted")
+    return future.result()
+
+def _kill(name):
+    pool = _pools.pop(name, None)
+    if pool is None:
+        return
+    terminate_workers = getattr(pool, "terminate_workers", None)
+    if terminate_workers is not None:
+        terminate_workers()
+    else:
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown():
+    for name in list(_pools):
+        _pools.pop(name).shutdown(wait=False, cancel_futures=True)